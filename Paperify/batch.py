@@ -0,0 +1,92 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fonts
+import tracing
+fonts.install_font_cache() # before matplotlib, also runs in each spawned worker
+
+# Headless: never pick an interactive matplotlib backend in the workers
+import matplotlib
+matplotlib.use("Agg")
+
+from examfile import read_exam_csv, find_exam_csvs
+from exporter import export_exam_pdf, cache_stats, format_cache_stats, ExportReport, BACKENDS, DEFAULT_BACKEND, STREAM_QUESTIONS
+
+# =============================================================================
+#    BATCH EXPORT: progress CSVs -> PDFs, one worker process per core
+# =============================================================================
+def output_path(src, out_dir=None):
+    name = os.path.splitext(os.path.basename(src))[0] + ".pdf"
+    return os.path.join(out_dir or os.path.dirname(src), name)
+
+
+def export_one(src, dst, urdu_font_path=None, backend=DEFAULT_BACKEND, stream=None, jobs=1):
+    """Runs inside a worker process, returns (elapsed seconds, export summary,
+    worker cache stats, what tracing recorded for this file). A long paper's
+    pages are measured on `jobs` processes of its own."""
+    t0 = time.perf_counter()
+    with tracing.span("export", file=os.path.basename(src)):
+        metadata, sections = read_exam_csv(src)
+        report = ExportReport()
+        export_exam_pdf(dst, metadata, sections, urdu_font_path, backend, report=report, stream=stream, jobs=jobs)
+    return time.perf_counter() - t0, report.summary(), cache_stats(), tracing.take()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export progress CSVs to exam PDFs without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="progress CSV files or folders containing them")
+    parser.add_argument("-o", "--out-dir", help="folder for the PDFs (default: next to each CSV)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: number of cores)")
+    parser.add_argument("--urdu-font", default=fonts.urdu_font(), help="TTF used for Urdu text")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help=f"PDF renderer (default: {DEFAULT_BACKEND})")
+    parser.add_argument("--stats", action="store_true", help="print the worker's text cache counters per file")
+    parser.add_argument("--stream", action="store_true", default=None,
+                        help="lay out each paper while writing it, in flat memory (default: papers over "
+                             f"{STREAM_QUESTIONS} questions)")
+    parser.add_argument("--trace", metavar="JSON", help="write a Chrome trace of all exports (or set PAPERIFY_TRACE)")
+    args = parser.parse_args(argv)
+    if args.trace: tracing.enable(args.trace) # before the pool, so workers inherit it
+
+    files = find_exam_csvs(args.inputs)
+    if not files:
+        print("No CSV files found.", file=sys.stderr)
+        return 2
+    if args.out_dir: os.makedirs(args.out_dir, exist_ok=True)
+
+    failures = 0
+    t_start = time.perf_counter()
+    # Cores left over from one worker per file go to the pages of each paper
+    page_jobs = max(1, args.jobs // len(files))
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(files)))) as pool:
+        jobs = {}
+        for src in files:
+            dst = output_path(src, args.out_dir)
+            jobs[pool.submit(export_one, src, dst, args.urdu_font, args.backend, args.stream, page_jobs)] = (src, dst)
+
+        for fut in as_completed(jobs):
+            src, dst = jobs[fut]
+            try:
+                elapsed, summary, stats, recorded = fut.result()
+                tracing.merge(recorded)
+                print(f"OK    {src} -> {dst} ({elapsed:.2f}s)")
+                for line in summary.splitlines(): print(f"      {line}")
+                if args.stats: print(f"      {format_cache_stats(stats)}")
+            except Exception as e:
+                failures += 1
+                print(f"FAIL  {src}: {e}", file=sys.stderr)
+
+    total = time.perf_counter() - t_start
+    print(f"{len(files) - failures} exported, {failures} failed in {total:.2f}s")
+    if tracing.enabled():
+        print(tracing.format_summary(tracing.summary()))
+        print("trace written to", tracing.save())
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+RESULTS_VERSION = 1
+
+# =============================================================================
+#    SYNTHETIC EXAMS (same config + seed, same paper, on every machine)
+# =============================================================================
+# `mix` weights pick each question's script and type: english/urdu/math for
+# the text (math is English with $...$ formulas in it), mcq/short/match for
+# the question type.
+DEFAULT_MIX = {"english": 6, "urdu": 3, "math": 1, "mcq": 5, "short": 3, "match": 2}
+
+ENGLISH_WORDS = ("what is the main reason why water boils at a lower temperature on high mountains "
+                 "explain energy force motion light sound cell plant animal earth sun moon river "
+                 "describe define compare state two uses of following give example").split()
+URDU_WORDS = ("\u067e\u0627\u06a9\u0633\u062a\u0627\u0646 \u0633\u0648\u0627\u0644 \u062c\u0648\u0627\u0628 "
+              "\u06a9\u062a\u0627\u0628 \u0639\u0644\u0645 \u062f\u0631\u0633\u062a \u063a\u0644\u0637 "
+              "\u0645\u0646\u062f\u0631\u062c\u06c1 \u0630\u06cc\u0644 \u0645\u06cc\u06ba \u0633\u06d2 "
+              "\u06a9\u0648\u0646 \u0633\u0627 \u06a9\u06cc\u0627 \u06c1\u06d2 \u0644\u06a9\u06be\u06cc\u06ba "
+              "\u0627\u06c1\u0645\u06cc\u062a \u067e\u0631 \u0628\u0627\u062a \u06a9\u0631\u06cc\u06ba "
+              "\u067e\u0627\u0646\u06cc \u0632\u0645\u06cc\u0646 \u0633\u0648\u0631\u062c").split()
+FORMULAS = ("$x^2 + y^2 = r^2$", "$E = mc^2$", r"$\frac{a}{b}$", r"$\sqrt{2}$", r"$v = u + at$",
+            r"$\alpha + \beta$", r"$F = \frac{G m_1 m_2}{r^2}$", "$H_2O$")
+
+
+def _pick(rng, weights, keys):
+    return rng.choices(keys, weights=[weights.get(k, 0) for k in keys])[0]
+
+
+def _words(rng, script, lo, hi):
+    pool = URDU_WORDS if script == "urdu" else ENGLISH_WORDS
+    words = [rng.choice(pool) for _ in range(rng.randint(lo, hi))]
+    if script == "math":
+        words.insert(rng.randrange(len(words) + 1), rng.choice(FORMULAS))
+    return " ".join(words)
+
+
+def synthetic_question(rng, mix):
+    script = _pick(rng, mix, ("english", "urdu", "math"))
+    q_type = _pick(rng, mix, ("mcq", "short", "match"))
+    if q_type == "mcq":
+        return {"type": "MCQ", "text": _words(rng, script, 6, 24),
+                "options": [_words(rng, script, 1, 4) for _ in range(4)], "answer": rng.randrange(4)}
+    if q_type == "match":
+        rows = rng.randint(3, 5)
+        return {"type": "Match Columns", "text": _words(rng, script, 3, 8),
+                "col_a": [_words(rng, script, 1, 3) for _ in range(rows)],
+                "col_b": [_words(rng, script, 1, 3) for _ in range(rows)]}
+    return {"type": "Short/Long Question", "text": _words(rng, script, 8, 40)}
+
+
+def synthetic_exam(sections=3, questions=20, mix=None, seed=0):
+    """Returns (metadata, sections) with `questions` questions per section"""
+    rng = random.Random(f"bench:{seed}")
+    mix = dict(DEFAULT_MIX, **(mix or {}))
+    metadata = {"school": "Benchmark School", "test": f"Synthetic {sections}x{questions}", "class": "9th",
+                "subject": "Science", "time": "3 Hrs", "marks": "100"}
+    out = []
+    for s in range(sections):
+        qs = [synthetic_question(rng, mix) for _ in range(questions)]
+        out.append({"name": f"Section {chr(ord('A') + s % 26)}", "desc": "Attempt all questions",
+                    "marks_per_q": 2, "attempt_count": questions, "total_marks": 2 * questions, "questions": qs})
+    return metadata, out
+
+
+# Named cases; `python bench.py run` runs all of them
+CASES = {
+    "small": {"sections": 3, "questions": 20},
+    "medium": {"sections": 5, "questions": 100},
+    "large": {"sections": 8, "questions": 500},
+    "urdu": {"sections": 4, "questions": 100, "mix": {"english": 0, "urdu": 1, "math": 0}},
+    "math": {"sections": 4, "questions": 100, "mix": {"english": 1, "urdu": 0, "math": 3}},
+    "match": {"sections": 4, "questions": 100, "mix": {"mcq": 0, "short": 0, "match": 1}},
+    # Laid out while written (layout.stream_exam): layout_s is 0, render_s is all of it
+    "booklet": {"sections": 8, "questions": 250, "stream": True},
+}
+
+
+# =============================================================================
+#    MEASURING (one fresh process per run, so caches and RSS start cold)
+# =============================================================================
+def run_case(config, backend, out_dir):
+    """Runs inside a fresh worker process: import, generate, lay out, render"""
+    t0 = time.perf_counter()
+    os.environ["PAPERIFY_PAGE_CACHE_MB"] = "0" # measure the full render, every run
+    import fonts
+    fonts.install_font_cache()
+    import matplotlib
+    matplotlib.use("Agg")
+    from reportlab import rl_config
+    rl_config.invariant = 1 # no creation date or random ID, so output size is comparable
+    from exporter import ExportReport, peak_rss, render_pages
+    from layout import layout_exam, stream_exam
+    t_import = time.perf_counter() - t0
+
+    metadata, sections = synthetic_exam(config["sections"], config["questions"], config.get("mix"),
+                                        config.get("seed", 0))
+    rss_before = peak_rss()
+    fn = os.path.join(out_dir, f"bench-{os.getpid()}.pdf")
+    report = ExportReport()
+    t1 = time.perf_counter()
+    if config.get("stream"):
+        pages = stream_exam(metadata, sections, fonts.urdu_font())
+    else:
+        pages = layout_exam(metadata, sections, fonts.urdu_font())
+    t2 = time.perf_counter()
+    count = render_pages(fn, pages, backend, report=report)
+    t3 = time.perf_counter()
+    size = os.path.getsize(fn)
+    os.remove(fn)
+    return {"import_s": t_import, "layout_s": t2 - t1, "render_s": t3 - t2, "wall_s": t3 - t1,
+            "pages": count, "bytes": size, "font_bytes": sum(report.font_bytes.values()),
+            "rss_before_mb": rss_before / 2**20, "peak_rss_mb": peak_rss() / 2**20}
+
+
+def measure(name, config, repeat, backend):
+    runs = []
+    ctx = get_context("spawn") # a forked child would inherit this process's caches
+    with tempfile.TemporaryDirectory() as out_dir:
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                runs.append(pool.submit(run_case, config, backend, out_dir).result())
+    result = {"config": config, "backend": backend, "runs": runs}
+    for field in ("wall_s", "layout_s", "render_s", "import_s", "peak_rss_mb"):
+        result[field] = statistics.median(r[field] for r in runs)
+    # Deterministic for a given tree, so any change here is a layout/render change
+    for field in ("pages", "bytes", "font_bytes"):
+        result[field] = runs[0][field]
+    return result
+
+
+def environment():
+    import matplotlib
+    import reportlab
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+            "cpus": os.cpu_count(), "reportlab": reportlab.Version, "matplotlib": matplotlib.__version__}
+
+
+# =============================================================================
+#    BASELINE COMPARISON
+# =============================================================================
+def compare(results, baseline, tolerance=0.10):
+    """Returns [(case, field, base, now, verdict)] for the cases both files
+    have. Timings and RSS regress past `tolerance`; page count and output
+    size are deterministic, so any difference there is reported."""
+    rows = []
+    for name, now in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None: continue
+        if base["config"] != now["config"] or base["backend"] != now["backend"]:
+            rows.append((name, "config", "", "", "CHANGED, not compared"))
+            continue
+        for field in ("wall_s", "layout_s", "render_s", "peak_rss_mb"):
+            b, n = base[field], now[field]
+            change = (n - b) / b if b else 0
+            verdict = "REGRESSION" if change > tolerance else "faster" if change < -tolerance else "ok"
+            rows.append((name, field, f"{b:.3f}", f"{n:.3f}", f"{change:+.1%} {verdict}"))
+        for field in ("pages", "bytes", "font_bytes"):
+            b, n = base[field], now[field]
+            if b != n: rows.append((name, field, str(b), str(n), "CHANGED"))
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        print("{:<10} {:<12} {:>12} {:>12}  {}".format(*row))
+    return sum(1 for row in rows if "REGRESSION" in row[4] or row[4] == "CHANGED")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export benchmarks on synthetic exams.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="run cases and write a results file")
+    run.add_argument("cases", nargs="*", help=f"named cases (default: all of {', '.join(CASES)})")
+    run.add_argument("--sections", type=int, help="custom case: sections")
+    run.add_argument("--questions", type=int, help="custom case: questions per section")
+    run.add_argument("--mix", default="", help="custom case weights, e.g. english=1,urdu=1,math=0,mcq=1,short=1,match=0")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--stream", action="store_true", help="custom case: lay out while writing")
+    run.add_argument("-n", "--repeat", type=int, default=3, help="runs per case, the median is kept (default: 3)")
+    run.add_argument("--backend", default="reportlab")
+    run.add_argument("-o", "--out", default="bench-results.json")
+    run.add_argument("--baseline", help="compare against this results file afterwards")
+    run.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown (default: 0.10)")
+    cmp = sub.add_parser("compare", help="compare two results files")
+    cmp.add_argument("results")
+    cmp.add_argument("baseline")
+    cmp.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.results) as f: results = json.load(f)
+        with open(args.baseline) as f: baseline = json.load(f)
+        return 1 if print_comparison(compare(results, baseline, args.tolerance)) else 0
+
+    if args.sections or args.questions:
+        mix = {k: float(v) for k, v in (item.split("=") for item in args.mix.split(",") if item)}
+        config = {"sections": args.sections or 3, "questions": args.questions or 20, "seed": args.seed}
+        if mix: config["mix"] = mix
+        if args.stream: config["stream"] = True
+        cases = {"custom": config}
+    else:
+        unknown = [c for c in args.cases if c not in CASES]
+        if unknown: parser.error(f"unknown case(s): {', '.join(unknown)}")
+        cases = {name: dict(CASES[name], seed=args.seed) for name in (args.cases or CASES)}
+
+    results = {"version": RESULTS_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "environment": environment(), "cases": {}}
+    for name, config in cases.items():
+        r = measure(name, config, args.repeat, args.backend)
+        results["cases"][name] = r
+        print(f"{name:<8} {r['pages']:>5} pages  {r['wall_s']:7.3f} s (layout {r['layout_s']:.3f}, "
+              f"render {r['render_s']:.3f})  peak {r['peak_rss_mb']:6.1f} MB  {r['bytes'] / 1024:8.1f} KB")
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+        return 1 if print_comparison(compare(results, baseline, args.tolerance)) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
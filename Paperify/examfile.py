@@ -0,0 +1,238 @@
+import csv
+import glob
+import os
+import time
+from collections import namedtuple
+
+# =============================================================================
+#    PROGRESS CSV (META / SEC / Q rows)
+# =============================================================================
+DEFAULT_METADATA = {
+    "school": "DAR-E-ARQAM SCHOOL",
+    "test": "Monthly Test",
+    "class": "",
+    "subject": "",
+    "time": "1 Hr 30 Mins",
+    "marks": "50"
+}
+META_FIELDS = ["school", "test", "class", "subject", "time", "marks"]
+
+
+QUESTION_TYPES = ("MCQ", "Short/Long Question", "Match Columns")
+
+# Older files wrote sections as SECTION,name,desc,marks (no attempt count)
+SECTION_TAGS = ("SEC", "SECTION")
+
+ExamRowError = namedtuple("ExamRowError", "line message")
+
+# Answers live on the question dict: q['answer'] is the correct option index
+# (MCQ) or, for Match Columns, the col_b index for each col_a row. q['notes']
+# is free text for the marking scheme. In the CSV they follow the Q row as
+# A,<answer>,<notes> with the option letter ("b") or 1-based "2|3|1".
+OPTION_LETTERS = "abcdefgh"
+
+
+class ReadReport:
+    """Filled in by read_exam_csv: rows seen, per-row errors and throughput"""
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.errors = []
+        self.has_metadata = False # the file had a META row
+
+    def summary(self):
+        rate = self.bytes / self.seconds / 1e6 if self.seconds else 0
+        text = f"{self.rows} rows in {self.seconds:.2f} s ({rate:.1f} MB/s)"
+        if self.errors: text += f", {len(self.errors)} rows skipped or fixed"
+        return text
+
+
+# =============================================================================
+#    WRITING (rows are generated and written one at a time)
+# =============================================================================
+def meta_row(md):
+    return ["META", md['school'], md['test'], md['class'], md['subject'], md['time'], md['marks']]
+
+
+def section_row(s):
+    return ["SEC", s['name'], s['desc'], s['marks_per_q'], s['attempt_count']]
+
+
+def question_row(q):
+    row = ["Q", q['type'], q['text']]
+    if q['type'] == "MCQ": row += q.get('options', [])
+    elif q['type'] == "Match Columns":
+        row += ["|".join(q.get('col_a', [])), "|".join(q.get('col_b', []))]
+    return row
+
+
+def answer_row(q):
+    ans, notes = q.get('answer'), q.get('notes', '')
+    if ans is None and not notes: return None
+    cell = ""
+    if ans is not None and q['type'] == "MCQ": cell = OPTION_LETTERS[ans]
+    elif ans and q['type'] == "Match Columns": cell = "|".join(str(i + 1) for i in ans)
+    return ["A", cell, notes]
+
+
+def question_rows(q):
+    yield question_row(q)
+    row = answer_row(q)
+    if row: yield row
+
+
+def exam_rows(metadata, sections):
+    yield meta_row(metadata)
+    for s in sections:
+        yield section_row(s)
+        for q in s['questions']:
+            yield from question_rows(q)
+
+
+def write_csv_rows(fn, rows):
+    """Writes any row iterable; an interrupted save keeps the old file"""
+    part = fn + ".part"
+    with open(part, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+    os.replace(part, fn)
+
+
+def write_exam_csv(fn, metadata, sections):
+    write_csv_rows(fn, exam_rows(metadata, sections))
+
+
+# =============================================================================
+#    READING (generator pipeline: lines -> records -> metadata/sections)
+# =============================================================================
+def iter_csv_rows(fn):
+    """Yields (row, line number), one row in memory at a time"""
+    with open(fn, 'r', newline='', encoding='utf-8-sig') as f:
+        r = csv.reader(f)
+        for row in r:
+            if any(row): yield row, r.line_num
+
+
+def _int(val, default, line, what, errors):
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        errors.append(ExamRowError(line, f"{what} {val!r} is not a number, using {default}"))
+        return default
+
+
+def parse_rows(rows, errors):
+    """Turns (row, line) pairs into ("meta", dict), ("section", dict) and
+    ("question", dict) records. Bad rows are reported to `errors` and skipped
+    (or repaired when the intent is clear) instead of stopping the import.
+    A question is held back one row so its A row can be attached first."""
+    have_section = False
+    pending = None # last question, until we know whether an A row follows
+    skipped_q = False
+    for row, line in rows:
+        tag = row[0].strip().upper()
+        if tag == "A":
+            if pending: _parse_answer(pending, row, line, errors)
+            elif not skipped_q: errors.append(ExamRowError(line, "answer without a question"))
+            continue
+        if pending:
+            yield "question", pending
+            pending = None
+        skipped_q = False
+
+        if tag == "META":
+            yield "meta", {key: val for key, val in zip(META_FIELDS, row[1:])}
+
+        elif tag in SECTION_TAGS:
+            if len(row) < 2 or not row[1].strip():
+                errors.append(ExamRowError(line, "section without a name"))
+                row = row + ["Section"] if len(row) < 2 else row[:1] + ["Section"] + row[2:]
+            marks = _int(row[3] if len(row) > 3 else 1, 1, line, "marks per question", errors)
+            attempt = _int(row[4] if len(row) > 4 else 1, 1, line, "attempt count", errors)
+            have_section = True
+            yield "section", {
+                "name": row[1], "desc": row[2] if len(row) > 2 else "",
+                "marks_per_q": marks, "attempt_count": attempt,
+                "total_marks": marks * attempt, "questions": []
+            }
+
+        elif tag == "Q":
+            if len(row) < 3 or not row[2].strip():
+                errors.append(ExamRowError(line, "question without text"))
+                skipped_q = True
+                continue
+            if row[1] not in QUESTION_TYPES:
+                errors.append(ExamRowError(line, f"unknown question type {row[1]!r}"))
+                skipped_q = True
+                continue
+            if not have_section:
+                errors.append(ExamRowError(line, "question before any section, added to 'Section'"))
+                have_section = True
+                yield "section", {"name": "Section", "desc": "", "marks_per_q": 1, "attempt_count": 1,
+                                  "total_marks": 1, "questions": []}
+            q = {"type": row[1], "text": row[2]}
+            if q['type'] == "MCQ": q['options'] = row[3:]
+            elif q['type'] == "Match Columns":
+                if len(row) < 5: errors.append(ExamRowError(line, "Match Columns needs both columns"))
+                q['col_a'] = row[3].split('|') if len(row) > 3 else []
+                q['col_b'] = row[4].split('|') if len(row) > 4 else []
+            pending = q
+
+        else:
+            errors.append(ExamRowError(line, f"unknown row type {row[0]!r}"))
+    if pending: yield "question", pending
+
+
+def _parse_answer(q, row, line, errors):
+    cell = row[1].strip().lower() if len(row) > 1 else ""
+    if len(row) > 2 and row[2]: q['notes'] = row[2]
+    if not cell: return
+    if q['type'] == "MCQ":
+        idx = OPTION_LETTERS.find(cell)
+        if len(cell) == 1 and 0 <= idx < len(q['options']): q['answer'] = idx
+        else: errors.append(ExamRowError(line, f"answer {cell!r} is not one of the options"))
+    elif q['type'] == "Match Columns":
+        try:
+            pairs = [int(x) - 1 for x in cell.split('|')]
+        except ValueError:
+            pairs = None
+        if pairs and len(pairs) == len(q['col_a']) and all(0 <= p < len(q['col_b']) for p in pairs):
+            q['answer'] = pairs
+        else: errors.append(ExamRowError(line, f"answer {cell!r} doesn't match the columns"))
+    else:
+        errors.append(ExamRowError(line, f"{q['type']} takes marking notes only"))
+
+
+def read_exam_csv(fn, report=None):
+    """Returns (metadata, sections) from a progress CSV. Pass a ReadReport to
+    get the row count, throughput and the rows that were skipped."""
+    report = report or ReadReport()
+    t0 = time.perf_counter()
+    metadata = dict(DEFAULT_METADATA)
+    sections = []
+    for kind, rec in parse_rows(counted_rows(iter_csv_rows(fn), report), report.errors):
+        if kind == "meta":
+            metadata.update(rec)
+            report.has_metadata = True
+        elif kind == "section": sections.append(rec)
+        else: sections[-1]['questions'].append(rec)
+    report.bytes = os.path.getsize(fn)
+    report.seconds = time.perf_counter() - t0
+    return metadata, sections
+
+
+def counted_rows(rows, report):
+    for row, line in rows:
+        report.rows += 1
+        yield row, line
+
+
+def find_exam_csvs(paths):
+    """Expands folders to the *.csv files inside them, files are kept as given"""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files += sorted(glob.glob(os.path.join(p, "*.csv")))
+        else:
+            files.append(p)
+    return files
@@ -0,0 +1,224 @@
+import json
+
+from PySide6.QtCore import Qt, QAbstractItemModel, QModelIndex, QMimeData, QByteArray
+from PySide6.QtGui import QColor, QFont
+
+MIME_TYPE = "application/x-paperify-rows"
+
+# Questions are handed to the view in batches as a section is expanded/scrolled
+FETCH_BATCH = 200
+
+# =============================================================================
+#    MODEL: EXAM STRUCTURE (sections -> questions, over the app's own list)
+# =============================================================================
+# Section rows carry the sections list as their internal pointer, question
+# rows carry the section dict they belong to. Every edit goes through the
+# methods below and emits only the rows it touched.
+class ExamTreeModel(QAbstractItemModel):
+    def __init__(self, sections, parent=None):
+        super().__init__(parent)
+        self.sections = sections
+        self._loaded = [0] * len(sections) # question rows the view has fetched, per section
+        self._sec_font = QFont(); self._sec_font.setBold(True)
+        self._sec_bg = QColor("#dfe6e9")
+
+    # --- HELPERS ---
+    def is_section(self, index):
+        return index.isValid() and index.internalPointer() is self.sections
+
+    def section_row(self, index):
+        """Row of the section an index belongs to (itself, or its parent)"""
+        if not index.isValid(): return -1
+        if self.is_section(index): return index.row()
+        return self._row_of(index.internalPointer())
+
+    def _row_of(self, sec):
+        return next(i for i, s in enumerate(self.sections) if s is sec)
+
+    def _fetch_all(self, s_row):
+        remaining = len(self.sections[s_row]['questions']) - self._loaded[s_row]
+        if remaining > 0:
+            parent = self.index(s_row, 0)
+            self.beginInsertRows(parent, self._loaded[s_row], self._loaded[s_row] + remaining - 1)
+            self._loaded[s_row] += remaining
+            self.endInsertRows()
+
+    def _renumber(self, s_row, first):
+        # "Q<n>:" labels below an insert/remove/move shift by one
+        last = self._loaded[s_row] - 1
+        if first <= last:
+            parent = self.index(s_row, 0)
+            self.dataChanged.emit(self.index(first, 0, parent), self.index(last, 0, parent), [Qt.DisplayRole])
+
+    # --- STRUCTURE ---
+    def index(self, row, column, parent=QModelIndex()):
+        if column != 0 or row < 0: return QModelIndex()
+        if not parent.isValid():
+            if row < len(self.sections): return self.createIndex(row, 0, self.sections)
+        elif self.is_section(parent):
+            if row < self._loaded[parent.row()]:
+                return self.createIndex(row, 0, self.sections[parent.row()])
+        return QModelIndex()
+
+    def parent(self, index=QModelIndex()):
+        if not index.isValid() or self.is_section(index): return QModelIndex()
+        return self.createIndex(self._row_of(index.internalPointer()), 0, self.sections)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid(): return len(self.sections)
+        if self.is_section(parent): return self._loaded[parent.row()]
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid(): return bool(self.sections)
+        if self.is_section(parent): return bool(self.sections[parent.row()]['questions'])
+        return False
+
+    def canFetchMore(self, parent):
+        return self.is_section(parent) and self._loaded[parent.row()] < len(self.sections[parent.row()]['questions'])
+
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent): return
+        s_row = parent.row()
+        first = self._loaded[s_row]
+        last = min(first + FETCH_BATCH, len(self.sections[s_row]['questions'])) - 1
+        self.beginInsertRows(parent, first, last)
+        self._loaded[s_row] = last + 1
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid(): return None
+        if self.is_section(index):
+            sec = self.sections[index.row()]
+            if role == Qt.DisplayRole: return f"{sec['name']} - {sec['desc']} ({sec['total_marks']} marks)"
+            if role == Qt.FontRole: return self._sec_font
+            if role == Qt.BackgroundRole: return self._sec_bg
+            return None
+        if role == Qt.DisplayRole:
+            q = index.internalPointer()['questions'][index.row()]
+            display_text = q['text'][:50] + "..." if len(q['text']) > 50 else q['text']
+            return f"Q{index.row()+1}: {display_text}"
+        return None
+
+    def question(self, index):
+        return index.internalPointer()['questions'][index.row()]
+
+    # --- EDITS ---
+    def set_sections(self, sections):
+        self.beginResetModel()
+        self.sections = sections
+        self._loaded = [0] * len(sections)
+        self.endResetModel()
+
+    def add_section(self, sec):
+        row = len(self.sections)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.sections.append(sec)
+        self._loaded.append(0)
+        self.endInsertRows()
+        return self.index(row, 0)
+
+    def section_changed(self, s_row):
+        idx = self.index(s_row, 0)
+        self.dataChanged.emit(idx, idx)
+
+    def remove_section(self, s_row):
+        self.beginRemoveRows(QModelIndex(), s_row, s_row)
+        del self.sections[s_row]
+        del self._loaded[s_row]
+        self.endRemoveRows()
+
+    def add_question(self, s_row, q):
+        questions = self.sections[s_row]['questions']
+        if self._loaded[s_row] < len(questions):
+            questions.append(q) # not fetched yet, it comes in with a later batch
+            return
+        row = len(questions)
+        parent = self.index(s_row, 0)
+        self.beginInsertRows(parent, row, row)
+        questions.append(q)
+        self._loaded[s_row] += 1
+        self.endInsertRows()
+
+    def update_question(self, s_row, q_row, q):
+        self.sections[s_row]['questions'][q_row] = q
+        idx = self.index(q_row, 0, self.index(s_row, 0))
+        self.dataChanged.emit(idx, idx, [Qt.DisplayRole])
+
+    def remove_question(self, s_row, q_row):
+        self.beginRemoveRows(self.index(s_row, 0), q_row, q_row)
+        del self.sections[s_row]['questions'][q_row]
+        self._loaded[s_row] -= 1
+        self.endRemoveRows()
+        self._renumber(s_row, q_row)
+
+    def moveRows(self, src_parent, src_row, count, dst_parent, dst_row):
+        """Moves `count` sections (root parents) or questions (section parents)"""
+        if count != 1: return False
+        if not src_parent.isValid() and not dst_parent.isValid():
+            if not self.beginMoveRows(src_parent, src_row, src_row, dst_parent, dst_row): return False
+            at = dst_row - 1 if dst_row > src_row else dst_row
+            self.sections.insert(at, self.sections.pop(src_row))
+            self._loaded.insert(at, self._loaded.pop(src_row))
+            self.endMoveRows()
+            return True
+
+        if not (self.is_section(src_parent) and self.is_section(dst_parent)): return False
+        s_from, s_to = src_parent.row(), dst_parent.row()
+        if not self.beginMoveRows(src_parent, src_row, src_row, dst_parent, dst_row): return False
+        at = dst_row - 1 if s_from == s_to and dst_row > src_row else dst_row
+        q = self.sections[s_from]['questions'].pop(src_row)
+        self.sections[s_to]['questions'].insert(at, q)
+        if s_from != s_to:
+            self._loaded[s_from] -= 1
+            self._loaded[s_to] += 1
+        self.endMoveRows()
+        self._renumber(s_from, min(src_row, at))
+        if s_from != s_to: self._renumber(s_to, at)
+        return True
+
+    # --- DRAG AND DROP (internal moves only) ---
+    def flags(self, index):
+        if not index.isValid(): return Qt.ItemIsDropEnabled
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+        if self.is_section(index): flags |= Qt.ItemIsDropEnabled
+        return flags
+
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    def mimeTypes(self):
+        return [MIME_TYPE]
+
+    def mimeData(self, indexes):
+        index = indexes[0]
+        if self.is_section(index): rows = [index.row(), -1]
+        else: rows = [self.section_row(index), index.row()]
+        mime = QMimeData()
+        mime.setData(MIME_TYPE, QByteArray(json.dumps(rows).encode()))
+        return mime
+
+    def dropMimeData(self, data, action, row, column, parent):
+        # The move is done here, so always report "not dropped": otherwise
+        # the view would also remove the source rows afterwards.
+        if action != Qt.MoveAction or not data.hasFormat(MIME_TYPE): return False
+        s_row, q_row = json.loads(bytes(data.data(MIME_TYPE)).decode())
+
+        if q_row < 0:
+            # Sections only reorder at the top level
+            if parent.isValid(): row = self.section_row(parent)
+            if row < 0: row = len(self.sections)
+            self.moveRows(QModelIndex(), s_row, 1, QModelIndex(), row)
+            return False
+
+        if not parent.isValid(): return False # questions can't become sections
+        if not self.is_section(parent):
+            row, parent = parent.row(), parent.parent()
+        if row < 0:
+            self._fetch_all(parent.row()) # dropped on the section: goes to its end
+            row = self._loaded[parent.row()]
+        self.moveRows(self.index(s_row, 0), q_row, 1, parent, row)
+        return False
@@ -0,0 +1,207 @@
+import importlib
+import os
+import sys
+
+from tracing import span
+
+# The layout/render stack (matplotlib, reshaper, bidi, reportlab) is imported
+# on first use, so the GUI can show its first dialog without loading it.
+# Renderers are imported on demand so the unused one is never loaded
+BACKENDS = {
+    "reportlab": "render_reportlab",
+    "matplotlib": "render_matplotlib",
+}
+DEFAULT_BACKEND = "reportlab"
+
+# Papers with more questions than this are laid out while they are written
+# (layout.stream_exam), so booklets run in flat memory on low-RAM machines
+STREAM_QUESTIONS = 400
+
+# Papers of at least this many pages have their pages measured on a process
+# pool (render_reportlab.iter_page_ops); shorter ones don't repay starting it
+POOL_MIN_PAGES = 8
+
+_page_cache = None
+
+
+class ExportCancelled(Exception):
+    """Raised from a progress callback to stop an export"""
+
+
+def format_bytes(n):
+    return f"{n / 1024:.1f} KB" if n < 1024 * 1024 else f"{n / 1024 / 1024:.1f} MB"
+
+
+def peak_rss():
+    """Peak resident set size of this process, in bytes"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024 # bytes on macOS, KB elsewhere
+
+
+class ExportReport:
+    """Filled in by an export: files written, pages reused from the page cache,
+    pages saved by optimal page breaking (layout.paginate) over the old greedy
+    rule, compressed font bytes embedded per font (reportlab only) and the
+    process's peak memory once the last file was written"""
+    def __init__(self):
+        self.files = []
+        self.pages = 0
+        self.cached_pages = 0
+        self.pages_saved = 0
+        self.font_bytes = {}
+        self.peak_rss = 0
+
+    def add_font(self, name, size):
+        self.font_bytes[name] = self.font_bytes.get(name, 0) + size
+
+    def summary(self):
+        size = sum(os.path.getsize(f) for f in self.files if os.path.exists(f))
+        text = f"{self.pages} pages, {format_bytes(size)}"
+        if self.cached_pages: text += f", {self.cached_pages} unchanged from the last export"
+        if self.pages_saved > 0: text += f", {self.pages_saved} saved over greedy page breaks"
+        elif self.pages_saved < 0: text += f", {-self.pages_saved} added to keep headings with their questions"
+        if self.peak_rss: text += f", peak memory {format_bytes(self.peak_rss)}"
+        if self.font_bytes:
+            fonts = ", ".join(f"{name} {format_bytes(n)}" for name, n in sorted(self.font_bytes.items()))
+            text += f"\nEmbedded fonts {format_bytes(sum(self.font_bytes.values()))}: {fonts}"
+        return text
+
+
+# =============================================================================
+#    PDF EXPORT (no Qt needed, shared by the GUI and batch.py)
+# =============================================================================
+def key_path(fn):
+    base, ext = os.path.splitext(fn)
+    return f"{base}_Key{ext or '.pdf'}"
+
+
+def export_exam_pdf(fn, metadata, sections, urdu_font_path=None, backend=DEFAULT_BACKEND, progress=None,
+                    answer_key=False, report=None, stream=None, jobs=None):
+    """Lays out and renders the paper, returns the page count.
+
+    `progress(message, done, total)` is called per section while laying out and
+    per page while rendering; it may raise ExportCancelled to abort. The PDF is
+    written to a temporary file first, so an aborted export leaves nothing behind.
+    With `answer_key` the key comes out of the same layout pass, as fn_Key.pdf.
+    `report` (an ExportReport) collects what was written.
+
+    With `stream` each page is written and let go before the questions after
+    it are laid out, so memory doesn't grow with the paper; progress then comes
+    per page only, with a total of 0 (unknown). None streams papers of more
+    than STREAM_QUESTIONS questions.
+
+    Papers of POOL_MIN_PAGES or more (streamed ones always) have their pages
+    measured on `jobs` worker processes (None: one per core, 1: none).
+    """
+    from layout import layout_exam, layout_exam_and_key, paginate, stream_exam
+    if stream is None:
+        stream = sum(len(sec['questions']) for sec in sections) > STREAM_QUESTIONS
+    pool = None
+    finished = False
+    try:
+        if stream:
+            key = [] if answer_key else None
+            pool = page_pool(jobs, backend)
+            count = render_pages(fn, stream_exam(metadata, sections, urdu_font_path, key), backend, progress,
+                                 report, pool)
+            if answer_key: render_pages(key_path(fn), paginate(key), backend, progress, report, pool)
+        else:
+            if answer_key: pages, key_pages = layout_exam_and_key(metadata, sections, urdu_font_path, progress, report)
+            else: pages = layout_exam(metadata, sections, urdu_font_path, progress, report)
+            pool = page_pool(jobs, backend, pages)
+            count = render_pages(fn, pages, backend, progress, report, pool)
+            if answer_key: render_pages(key_path(fn), key_pages, backend, progress, report, pool)
+        finished = True
+        return count
+    finally:
+        # On cancel/error don't wait for the pages still queued
+        if pool is not None: pool.shutdown(wait=finished, cancel_futures=True)
+
+
+def page_pool(jobs=None, backend=DEFAULT_BACKEND, pages=None):
+    """A process pool of `jobs` workers (None: one per core) for render_pages,
+    or None where it doesn't pay: one job, the matplotlib backend or fewer
+    than POOL_MIN_PAGES `pages` (None: not known yet, streamed)"""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs < 2 or backend != "reportlab" or (pages is not None and len(pages) < POOL_MIN_PAGES): return None
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=jobs)
+
+
+def page_cache():
+    """The shared on-disk page cache, or None when turned off (PAPERIFY_PAGE_CACHE_MB=0)"""
+    global _page_cache
+    if _page_cache is None:
+        from pagecache import PageCache, configured_max_bytes
+        if configured_max_bytes() <= 0: return None
+        try: _page_cache = PageCache()
+        except OSError: return None
+    return _page_cache
+
+
+def render_pages(fn, pages, backend=DEFAULT_BACKEND, progress=None, report=None, pool=None):
+    """Renders laid out pages (a list, or a stream_exam() generator) through a
+    .part file like export_exam_pdf, returns the page count. Pages already in
+    the page cache skip their text measuring, and with a process `pool` the
+    rest are measured on its workers (reportlab only)."""
+    renderer = importlib.import_module(BACKENDS[backend])
+    tmp_fn = fn + ".part"
+    try:
+        with span("render", "render", file=os.path.basename(fn), backend=backend) as sp:
+            count = renderer.render_pdf(tmp_fn, pages, progress, page_cache(), report, pool)
+            sp.set(pages=count)
+        os.replace(tmp_fn, fn)
+        if report is not None:
+            report.files.append(fn)
+            report.pages += count
+            report.peak_rss = peak_rss()
+        return count
+    finally:
+        if os.path.exists(tmp_fn): os.remove(tmp_fn)
+
+
+def warm_up(backend=DEFAULT_BACKEND, urdu_font_path=None):
+    """Loads the render stack and fonts ahead of the first export (safe on a thread)"""
+    from metrics import text_extent
+    from shaping import process_text
+    importlib.import_module(BACKENDS[backend])
+    text_extent("Warm up $x^2$", None, 12)
+    if urdu_font_path:
+        text_extent(process_text("اردو", urdu_font_path)[0], urdu_font_path, 13)
+
+
+def cache_stats():
+    """Hit/miss counters of the per-process text caches and the page cache"""
+    from mathcache import formula_cache_info
+    from metrics import font_properties, text_extent
+    from shaping import runs_cache_info, shaping_cache_info
+    infos = {
+        "shaping": shaping_cache_info(),
+        "script_runs": runs_cache_info(),
+        "font_properties": font_properties.cache_info(),
+        "text_extent": text_extent.cache_info(),
+        "formulas": formula_cache_info(),
+    }
+    stats = {name: {"hits": i.hits, "misses": i.misses, "size": i.currsize} for name, i in infos.items()}
+    if _page_cache is not None: stats["pages"] = _page_cache.stats()
+    return stats
+
+
+def format_cache_stats(stats):
+    return ", ".join(f"{name} {s['hits']}/{s['hits'] + s['misses']} hits" for name, s in stats.items())
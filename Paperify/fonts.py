@@ -0,0 +1,80 @@
+import glob
+import os
+import shutil
+import sys
+
+# =============================================================================
+#    FONT REGISTRY (bundled TTFs, resolved from the app folder, not the CWD)
+# =============================================================================
+# PyInstaller unpacks datas under sys._MEIPASS; from source it's this folder.
+BASE_DIR = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+
+FONT_FILES = {
+    "jnn": "JNN.ttf",
+    "nastaliq": "NotoNastaliqUrdu-VariableFont_wght.ttf",
+    "naskh": "NotoNaskhArabic-VariableFont_wght.ttf",
+    "times": "times.ttf",
+}
+
+# First one found is used for Urdu text
+URDU_FONTS = ("jnn", "nastaliq", "naskh")
+
+# Prebuilt matplotlib fontlist shipped inside the build (see main.spec)
+BUNDLED_CACHE_DIR = os.path.join(BASE_DIR, "mpl-cache")
+
+
+def font_path(key):
+    """Absolute path of a bundled font, or None if it isn't shipped"""
+    path = os.path.join(BASE_DIR, FONT_FILES[key])
+    return path if os.path.exists(path) else None
+
+
+def urdu_font():
+    for key in URDU_FONTS:
+        path = font_path(key)
+        if path: return path
+    return None
+
+
+# =============================================================================
+#    MATPLOTLIB FONT CACHE
+# =============================================================================
+def user_cache_dir():
+    root = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "Paperify", "matplotlib")
+
+
+def install_font_cache():
+    """Points matplotlib at a persistent cache seeded from the bundled fontlist.
+
+    The PyInstaller runtime hook gives every launch a fresh temp MPLCONFIGDIR,
+    so matplotlib would rescan the system fonts on each start. Must run before
+    matplotlib is imported; does nothing when running from source.
+    """
+    if not getattr(sys, "frozen", False) or "matplotlib" in sys.modules:
+        return
+    cache_dir = user_cache_dir()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for src in glob.glob(os.path.join(BUNDLED_CACHE_DIR, "fontlist-*.json")):
+            dst = os.path.join(cache_dir, os.path.basename(src))
+            if not os.path.exists(dst): shutil.copyfile(src, dst)
+    except OSError:
+        return # read-only profile, let matplotlib fall back to its temp dir
+    os.environ["MPLCONFIGDIR"] = cache_dir
+
+
+def build_font_cache(dest):
+    """Build step: writes fontlist-v*.json into `dest` (run in a fresh process)"""
+    os.makedirs(dest, exist_ok=True)
+    os.environ["MPLCONFIGDIR"] = os.path.abspath(dest)
+    import matplotlib.font_manager  # noqa: F401 -- imported for its side effect: scans the fonts and dumps the fontlist
+    return glob.glob(os.path.join(dest, "fontlist-*.json"))
+
+
+if __name__ == "__main__":
+    # python fonts.py --build-cache <dir>
+    if len(sys.argv) != 3 or sys.argv[1] != "--build-cache":
+        sys.exit("usage: python fonts.py --build-cache <dir>")
+    for path in build_font_cache(sys.argv[2]):
+        print("wrote", path)
@@ -0,0 +1,425 @@
+import warnings
+from collections import namedtuple
+
+from examfile import OPTION_LETTERS
+from metrics import PT, text_extent, wrap_text
+from shaping import is_urdu_text, process_text, script_runs
+from tracing import span
+
+# === PAGE GEOMETRY (inches, A4) ===
+PAGE_W, PAGE_H = 8.27, 11.69
+MARGIN_X, MARGIN_TOP, MARGIN_BTM = 0.5, 0.5, 0.5
+CONTENT_W = PAGE_W - (2 * MARGIN_X)
+BODY_H = PAGE_H - MARGIN_TOP - MARGIN_BTM
+
+# Increased Font Sizes by 1-2px approx (1 pt ~ 1.3px, keeping logical scale)
+FS_HEADER, FS_SUB, FS_BODY = 18, 14, 12
+
+# Reduced Line Height (0.25 -> 0.21)
+LH = 0.21
+
+H_BOX_H = 2.0
+SEC_H = 0.4
+
+# Question text runs from the number indent to the right margin
+Q_INDENT = 0.5
+WRAP_W = CONTENT_W - Q_INDENT
+
+# =============================================================================
+#    PAGE MODEL
+# =============================================================================
+# Coordinates are inches from the bottom-left corner of the page. Text is
+# already shaped (display order); `font` is a TTF path or None for the
+# default serif face. A line mixing Urdu with English or math also has
+# `runs`, its (segment, font) parts left to right (shaping.script_runs).
+Text = namedtuple("Text", "x y text fs weight ha va font runs", defaults=(None,))
+Box = namedtuple("Box", "x y w h pad fc lw")
+Rule = namedtuple("Rule", "x0 y0 x1 y1 lw")
+
+# A block is the unit the paginator moves around. Its items are positioned
+# relative to the block top (y <= 0). `height` is how far it advances the
+# cursor, `need` is the space that must be left below the cursor to start it
+# on the current page. `breaks` are the distances below the top where a page
+# may cut the block (between lines of a long question).
+Block = namedtuple("Block", "kind items height need breaks", defaults=((),))
+
+# Blocks of these kinds only start a page together with the block after them:
+# the header and section banners never end a page without their first question.
+# MCQs have no breaks, so their options always stay with the stem.
+KEEP_WITH_NEXT = ("header", "section")
+
+# A question is only cut with at least this many lines (or Match Columns
+# rows) on both pages, and a cut costs as much as this much empty page
+# (inches squared), so it is made to save a page or a large gap, not for less
+MIN_LINES = 2
+SPLIT_PENALTY = 16.0
+
+# The old greedy rule started a section banner only with an inch left on the
+# page; pages_saved is reported against it
+GREEDY_BANNER_SPACE = 1.0
+
+
+def _moved(item, dy):
+    if isinstance(item, Rule):
+        return item._replace(y0=item.y0 + dy, y1=item.y1 + dy)
+    return item._replace(y=item.y + dy)
+
+
+def text_item(x, y, txt, fs=12, weight='normal', align='left', v_align='baseline', force_rtl=True, urdu_font_path=None):
+    final_txt, is_urdu = process_text(txt, urdu_font_path)
+    eff_x, eff_align = x, align
+    eff_fs = fs
+    font = runs = None
+
+    if is_urdu:
+        weight = 'normal' # Urdu fonts usually don't support bold weights well
+        eff_fs += 1 # Increase Urdu font slightly more for readability
+        font = urdu_font_path
+        runs = script_runs(txt, urdu_font_path)
+        if len(runs) < 2: runs = None
+        if force_rtl:
+            if align == 'left': eff_align, eff_x = 'right', PAGE_W - x
+            elif align == 'right': eff_align, eff_x = 'left', PAGE_W - x
+
+    return Text(eff_x, y, final_txt, eff_fs, weight, eff_align, v_align, font, runs)
+
+
+# =============================================================================
+#    PASS 1: BLOCKS
+# =============================================================================
+def header_block(metadata, urdu_font_path=None, student_fields=True):
+    def t(*args): return text_item(*args, urdu_font_path=urdu_font_path)
+    items = [Box(MARGIN_X, -H_BOX_H, CONTENT_W, H_BOX_H, 0.1, "white", 2)]
+
+    cx = PAGE_W / 2
+    items.append(t(cx, -0.3, metadata['school'], FS_HEADER, 'bold', 'center'))
+    items.append(t(cx, -0.6, metadata['test'], FS_SUB, 'bold', 'center'))
+
+    rule_y = -0.8
+    items.append(Rule(MARGIN_X + 0.2, rule_y, PAGE_W - MARGIN_X - 0.2, rule_y, 1))
+
+    meta_y = rule_y - 0.3
+    items.append(t(MARGIN_X + 0.2, meta_y, f"Class: {metadata['class']}", FS_BODY))
+    items.append(t(cx + 0.5, meta_y, f"Time: {metadata['time']}", FS_BODY))
+
+    meta_y -= 0.25
+    items.append(t(MARGIN_X + 0.2, meta_y, f"Subject: {metadata['subject']}", FS_BODY))
+    items.append(t(cx + 0.5, meta_y, f"Marks: {metadata['marks']}", FS_BODY))
+
+    if student_fields:
+        name_y = meta_y - 0.35
+        items.append(t(MARGIN_X + 0.2, name_y, "Name: __________________________", FS_BODY))
+        items.append(t(cx + 0.5, name_y, "Roll No: ____________", FS_BODY))
+
+    return Block("header", tuple(items), H_BOX_H + 0.3, 0)
+
+
+def section_block(sec, urdu_font_path=None):
+    items = [Box(MARGIN_X, -SEC_H, CONTENT_W, SEC_H, 0.05, "#ecf0f1", 1)]
+
+    sy = -0.25
+    title = f"{sec['name']}   {sec['desc']}"
+    marks = f"({sec['marks_per_q']} x {sec['attempt_count']} = {sec['total_marks']})"
+
+    items.append(text_item(MARGIN_X + 0.1, sy, title, FS_BODY, 'bold', urdu_font_path=urdu_font_path))
+    items.append(text_item(PAGE_W - MARGIN_X - 0.1, sy, marks, FS_BODY, 'bold', 'right', urdu_font_path=urdu_font_path))
+
+    # Kept with the first question by the paginator (KEEP_WITH_NEXT)
+    return Block("section", tuple(items), SEC_H + 0.2, SEC_H + 0.2)
+
+
+def line_advance(text, fs, font=None):
+    # Tall lines (fractions, integrals) push the next line down instead of overlapping it
+    return max(LH, text_extent(text, font, fs)[1] / PT + (LH - fs / PT))
+
+
+def question_block(q, number, urdu_font_path=None):
+    def t(*args): return text_item(*args, urdu_font_path=urdu_font_path)
+    items = []
+    cursor_y = 0
+    q_num = f"{number}."
+    is_urdu_q = is_urdu_text(q['text'])
+    if is_urdu_q:
+        fs, font = FS_BODY + 1, urdu_font_path
+        lines = wrap_text(q['text'], WRAP_W, fs, font, shaped=True)
+    else:
+        fs, font = FS_BODY, None
+        lines = wrap_text(q['text'], WRAP_W, fs)
+
+    items.append(t(MARGIN_X, cursor_y, q_num, FS_BODY, 'bold', 'left', 'top', False))
+    tops = [] # where each line starts, for the page breaks
+    if is_urdu_q:
+        anchor = PAGE_W - MARGIN_X - 0.1
+        for ln in lines:
+            tops.append(-cursor_y)
+            items.append(t(anchor, cursor_y, ln, FS_BODY, 'normal', 'right', 'top', False))
+            cursor_y -= line_advance(process_text(ln, font)[0], fs, font)
+    else:
+        anchor = MARGIN_X + Q_INDENT
+        for ln in lines:
+            tops.append(-cursor_y)
+            items.append(t(anchor, cursor_y, ln, FS_BODY, 'normal', 'left', 'top', False))
+            cursor_y -= line_advance(ln, fs)
+    breaks = [] if q['type'] == "MCQ" else tops[MIN_LINES:len(tops) - MIN_LINES + 1]
+
+    # Options
+    cursor_y -= 0.1
+    if q['type'] == "MCQ":
+        opts = q.get('options', [])
+        opt_y = cursor_y
+        if is_urdu_q:
+            # Urdu Layout (Right aligned)
+            if len(opts)>0: items.append(t(anchor, opt_y, f"{opts[0]} (a)", FS_BODY, 'normal', 'right', 'baseline', False))
+            if len(opts)>2: items.append(t(anchor, opt_y-LH, f"{opts[2]} (c)", FS_BODY, 'normal', 'right', 'baseline', False))
+            if len(opts)>1: items.append(t(anchor-3.5, opt_y, f"{opts[1]} (b)", FS_BODY, 'normal', 'right', 'baseline', False))
+            if len(opts)>3: items.append(t(anchor-3.5, opt_y-LH, f"{opts[3]} (d)", FS_BODY, 'normal', 'right', 'baseline', False))
+            cursor_y = opt_y - (2*LH) - 0.15
+        else:
+            # English Layout
+            if len(opts)>0: items.append(t(anchor, opt_y, f"(a) {opts[0]}", FS_BODY))
+            if len(opts)>1: items.append(t(anchor+3.5, opt_y, f"(b) {opts[1]}", FS_BODY))
+            opt_y -= LH
+            if len(opts)>2: items.append(t(anchor, opt_y, f"(c) {opts[2]}", FS_BODY))
+            if len(opts)>3: items.append(t(anchor+3.5, opt_y, f"(d) {opts[3]}", FS_BODY))
+            cursor_y = opt_y - 0.2
+
+    elif q['type'] == "Match Columns":
+        col_a, col_b = q.get('col_a', []), q.get('col_b', [])
+        # Rows sit on their baseline, so a cut before one leaves room for its text above it
+        rise = FS_BODY / PT
+        if len(tops) >= MIN_LINES: breaks.append(-cursor_y - rise)
+        items.append(t(MARGIN_X+1, cursor_y, "Column A", FS_BODY, 'bold'))
+        items.append(t(MARGIN_X+4, cursor_y, "Column B", FS_BODY, 'bold'))
+        cursor_y -= LH
+        rows = max(len(col_a), len(col_b))
+        for i in range(rows):
+            if MIN_LINES <= i <= rows - MIN_LINES: breaks.append(-cursor_y - rise)
+            if i < len(col_a): items.append(t(MARGIN_X+1, cursor_y, col_a[i], FS_BODY))
+            if i < len(col_b): items.append(t(MARGIN_X+4, cursor_y, col_b[i], FS_BODY))
+            cursor_y -= LH
+        cursor_y -= 0.2
+
+    # Lines are measured, so the block needs exactly the space it takes
+    return Block("question", tuple(items), -cursor_y, -cursor_y, tuple(breaks))
+
+
+def checked_answer(q, number):
+    """q['answer'] if it names a filled option (MCQ) or a Column B row for
+    every Column A row, else None with a warning: answers from the question
+    bank or a project file never went through examfile's checks"""
+    ans = q.get('answer')
+    if ans is None: return None
+    if q['type'] == "MCQ":
+        opts = q.get('options', [])
+        if type(ans) is int and 0 <= ans < min(len(opts), len(OPTION_LETTERS)) and opts[ans].strip(): return ans
+    elif q['type'] == "Match Columns":
+        col_a, col_b = q.get('col_a', []), q.get('col_b', [])
+        if (isinstance(ans, list) and len(ans) == len(col_a)
+                and all(type(i) is int and 0 <= i < len(col_b) for i in ans)): return ans
+    warnings.warn(f"Question {number}: answer {ans!r} doesn't match the question, left out of the key")
+    return None
+
+
+def key_block(q, number, urdu_font_path=None):
+    """Answer key entry, or None if the question has no answer or notes. The
+    option strings are the exact ones the paper prints, so their shaping and
+    widths come straight from the caches filled by question_block."""
+    def t(*args): return text_item(*args, urdu_font_path=urdu_font_path)
+    ans, notes = checked_answer(q, number), q.get('notes', '')
+    if ans is None and not notes: return None
+
+    is_urdu_q = is_urdu_text(q['text'])
+    anchor = PAGE_W - MARGIN_X - 0.1 if is_urdu_q else MARGIN_X + Q_INDENT
+    align = 'right' if is_urdu_q else 'left'
+    items = [t(MARGIN_X, 0, f"{number}.", FS_BODY, 'bold', 'left', 'top', False)]
+    cursor_y = 0
+
+    lines = []
+    if ans is not None and q['type'] == "MCQ":
+        letter, opt = OPTION_LETTERS[ans], q['options'][ans]
+        lines.append(f"{opt} ({letter})" if is_urdu_q else f"({letter}) {opt}")
+    elif ans and q['type'] == "Match Columns":
+        col_a, col_b = q['col_a'], q['col_b']
+        lines += [f"{col_a[i]}  →  {col_b[j]}" for i, j in enumerate(ans)]
+    for ln in lines:
+        items.append(t(anchor, cursor_y, ln, FS_BODY, 'normal', align, 'top', False))
+        cursor_y -= LH
+
+    if notes:
+        fs, font = (FS_BODY, urdu_font_path) if is_urdu_text(notes) else (FS_BODY - 1, None)
+        for ln in wrap_text(notes, WRAP_W, fs, font, shaped=font is not None):
+            items.append(t(anchor, cursor_y, ln, FS_BODY - 1, 'normal', align, 'top', False))
+            cursor_y -= LH
+
+    cursor_y -= 0.1
+    return Block("key", tuple(items), -cursor_y, -cursor_y)
+
+
+def iter_blocks(metadata, sections, urdu_font_path=None, progress=None, key=None):
+    """Yields the paper's blocks in order. `progress(message, done, total)` is
+    called after every section. If `key` is a list, the answer key blocks are
+    collected into it in the same pass."""
+    yield header_block(metadata, urdu_font_path)
+    if key is not None:
+        key_md = dict(metadata, test=f"{metadata['test']} - Answer Key")
+        key.append(header_block(key_md, urdu_font_path, student_fields=False))
+    for s_idx, sec in enumerate(sections):
+        # Streamed, this span also covers rendering the section's pages
+        with span("section", "layout", section=sec['name'], questions=len(sec['questions'])):
+            blk = section_block(sec, urdu_font_path)
+            if key is not None: key.append(blk)
+            yield blk
+            for idx, q in enumerate(sec['questions']):
+                with span("question", "layout", number=idx + 1, type=q['type']):
+                    blk = question_block(q, idx + 1, urdu_font_path)
+                    entry = key_block(q, idx + 1, urdu_font_path) if key is not None else None
+                if entry: key.append(entry)
+                yield blk
+        if progress: progress(f"Laying out {sec['name']}", s_idx + 1, len(sections))
+
+
+def build_blocks(metadata, sections, urdu_font_path=None, progress=None, key=None):
+    return list(iter_blocks(metadata, sections, urdu_font_path, progress, key))
+
+
+# =============================================================================
+#    PASS 2: PAGINATION
+# =============================================================================
+def _top(item):
+    return -(item.y0 if isinstance(item, Rule) else item.y)
+
+
+def split_block(blk):
+    """The block cut at all its breaks: pieces with their items moved up to
+    the piece's top. All but the last are of kind "part"."""
+    if not blk.breaks: return [blk]
+    cuts = (0,) + blk.breaks + (blk.height,)
+    pieces = []
+    for k in range(len(cuts) - 1):
+        top, bottom = cuts[k], cuts[k + 1]
+        last = k == len(cuts) - 2
+        items = tuple(_moved(it, top) for it in blk.items if top <= _top(it) and (last or _top(it) < bottom))
+        if last: pieces.append(Block(blk.kind, items, blk.height - top, blk.need - top))
+        else: pieces.append(Block("part", items, bottom - top, bottom - top))
+    return pieces
+
+
+def iter_groups(blocks):
+    """Yields the blocks in the units pages are broken between: lists of one
+    block, or a KEEP_WITH_NEXT run with the block after it"""
+    group = []
+    for blk in blocks:
+        group.append(blk)
+        if blk.kind not in KEEP_WITH_NEXT:
+            yield group
+            group = []
+    if group: yield group
+
+
+def group_size(group):
+    """(height, need, penalty) of a group: how far it advances the cursor, how
+    much space it must have left on the page and what ending a page after it
+    costs"""
+    height = sum(blk.height for blk in group)
+    penalty = SPLIT_PENALTY if group[-1].kind == "part" else 0.0
+    return height, height - group[-1].height + group[-1].need, penalty
+
+
+def _page(groups):
+    items = []
+    cursor_y = PAGE_H - MARGIN_TOP
+    for group in groups:
+        for blk in group:
+            items += [_moved(it, cursor_y) for it in blk.items]
+            cursor_y -= blk.height
+    return tuple(items)
+
+
+def iter_pages(blocks):
+    """Greedy: places groups top to bottom, yields each page (a tuple of items)
+    as soon as the next group no longer fits on it. Used while streaming,
+    where the blocks after the current page aren't known yet."""
+    page, used = [], 0
+    for group in iter_groups(blocks):
+        height, need, _ = group_size(group)
+        if page and used + need > BODY_H:
+            yield _page(page)
+            page, used = [], 0
+        page.append(group)
+        used += height
+    yield _page(page)
+
+
+def optimal_breaks(sizes):
+    """Dynamic programming over where pages start, for groups of (height,
+    need, penalty): fewest pages first, then the least sum of squared empty
+    space on every page but the last (so no page is left half empty to fill a
+    later one) plus the penalties of the groups pages end on. A group too tall
+    for any page gets a page of its own. Returns the index of the first group
+    on each page."""
+    n = len(sizes)
+    best = [(0, 0.0, 0)] + [None] * n # (pages, badness, start of the last page) for groups[:j]
+    for j in range(1, n + 1):
+        fill = sizes[j - 1][1]
+        used = 0.0
+        for i in range(j - 1, -1, -1):
+            used += sizes[i][0]
+            if i < j - 1: fill += sizes[i][0]
+            if fill > BODY_H and i < j - 1: break
+            pages, badness, _ = best[i]
+            if j < n: badness += max(0.0, BODY_H - used) ** 2 + sizes[j - 1][2]
+            cand = (pages + 1, badness, i)
+            if best[j] is None or cand[:2] < best[j][:2]: best[j] = cand
+    starts = []
+    while n:
+        n = best[n][2]
+        starts.append(n)
+    return starts[::-1]
+
+
+def greedy_page_count(blocks):
+    """Pages the old greedy breaking took: each block placed as soon as it
+    fits, a section banner only with GREEDY_BANNER_SPACE left"""
+    pages, used = 1, 0
+    for blk in blocks:
+        need = max(blk.need, GREEDY_BANNER_SPACE) if blk.kind == "section" else blk.need
+        if used and used + need > BODY_H:
+            pages += 1
+            used = 0
+        used += blk.height
+    return pages
+
+
+def paginate(blocks, report=None):
+    """Returns the list of pages, broken by optimal_breaks between blocks and
+    at their breaks. `report` (an ExportReport) gets the pages saved against
+    greedy_page_count."""
+    with span("paginate", "layout", blocks=len(blocks)) as sp:
+        groups = list(iter_groups(piece for blk in blocks for piece in split_block(blk)))
+        if not groups: return [()]
+        starts = optimal_breaks([group_size(g) for g in groups])
+        pages = [_page(groups[a:b]) for a, b in zip(starts, starts[1:] + [len(groups)])]
+        saved = greedy_page_count(blocks) - len(pages)
+        sp.set(pages=len(pages), saved=saved)
+        if report is not None: report.pages_saved += saved
+        return pages
+
+
+def layout_exam(metadata, sections, urdu_font_path=None, progress=None, report=None):
+    with span("layout", "layout"):
+        return paginate(build_blocks(metadata, sections, urdu_font_path, progress), report)
+
+
+def layout_exam_and_key(metadata, sections, urdu_font_path=None, progress=None, report=None):
+    """Returns (paper pages, answer key pages) from one layout pass"""
+    key = []
+    with span("layout", "layout", answer_key=True):
+        blocks = build_blocks(metadata, sections, urdu_font_path, progress, key)
+        return paginate(blocks, report), paginate(key) # pages saved count the paper only
+
+
+def stream_exam(metadata, sections, urdu_font_path=None, key=None):
+    """Yields the paper's pages while laying it out: each page is handed on as
+    soon as the first block that doesn't fit on it is laid out, so neither the
+    block list nor the page list is ever held whole. `key` as in iter_blocks."""
+    return iter_pages(iter_blocks(metadata, sections, urdu_font_path, key=key))
@@ -1,37 +1,40 @@
 import sys
-import csv
-import textwrap
-import re
 import os
+import copy
+import threading
+import time
+import multiprocessing
+import random
+
+import startup
+startup.install() # times the imports below, only with --startup-profile
+
+import fonts
+import tracing
+fonts.install_font_cache() # before anything imports matplotlib
+
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QTextEdit, QPushButton, QComboBox,
-    QTreeWidget, QTreeWidgetItem, QMessageBox, QLineEdit, QSpinBox, 
+    QTreeView, QMessageBox, QLineEdit, QSpinBox, 
     QFormLayout, QGroupBox, QScrollArea, QFileDialog,
-    QDialog, QDialogButtonBox, QFrame, QMenu, QAbstractItemView, QSplitter
+    QDialog, QDialogButtonBox, QFrame, QMenu, QAbstractItemView, QSplitter,
+    QProgressDialog, QListWidget, QListWidgetItem, QCheckBox
 )
-from PySide6.QtCore import Qt, QSize
-from PySide6.QtGui import QColor, QAction, QFont, QIcon
-
-# --- MATPLOTLIB IMPORTS ---
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-from matplotlib.patches import FancyBboxPatch
-import matplotlib.font_manager as fm
-
-# --- URDU TEXT HANDLERS ---
-try:
-    import arabic_reshaper
-    from bidi.algorithm import get_display
-    HAS_URDU_LIB = True
-except ImportError:
-    HAS_URDU_LIB = False
-    print("Warning: 'arabic-reshaper' or 'python-bidi' not installed.")
-
-# --- PDF SETTINGS ---
-plt.rcParams['font.family'] = 'serif'
-plt.rcParams['mathtext.fontset'] = 'cm' 
-plt.rcParams['axes.unicode_minus'] = False 
+from PySide6.QtCore import Qt, QSize, QObject, QThread, QTimer, Signal, Slot, QPersistentModelIndex, QUrl
+from PySide6.QtGui import QColor, QAction, QFont, QIcon, QDesktopServices
+
+# --- PAPER EXPORT / FILE FORMAT ---
+# exporter only pulls in matplotlib/reportlab/reshaper on first use
+from examfile import read_exam_csv, write_exam_csv, ReadReport
+from exporter import export_exam_pdf, warm_up, ExportCancelled, ExportReport, DEFAULT_BACKEND
+from exammodel import ExamTreeModel
+from preview import PreviewPane
+from questionbank import QuestionBank
+from projectfile import LazyQuestions, read_project, write_project, is_project
+from variants import export_variants
+
+PROJECT_FILTER = "Paperify Project (*.paperify);;CSV (*.csv)"
 
 # =============================================================================
 #    DIALOG: STARTUP DETAILS
@@ -194,6 +197,252 @@ class SectionSetupDialog(QDialog):
         }
         self.accept()
 
+# =============================================================================
+#    DIALOG: QUESTION BANK (search past papers, insert into the current exam)
+# =============================================================================
+class QuestionBankDialog(QDialog):
+    def __init__(self, app_window, bank):
+        super().__init__(app_window)
+        self.app_window = app_window
+        self.bank = bank
+        self.setWindowTitle("Question Bank")
+        self.resize(700, 600)
+
+        layout = QVBoxLayout()
+
+        self.inp_search = QLineEdit()
+        self.inp_search.setPlaceholderText("Search question text (Urdu/English)...")
+        layout.addWidget(self.inp_search)
+
+        filters = QHBoxLayout()
+        self.cb_class, self.cb_subject, self.cb_type = QComboBox(), QComboBox(), QComboBox()
+        for label, cb in (("Class:", self.cb_class), ("Subject:", self.cb_subject), ("Type:", self.cb_type)):
+            filters.addWidget(QLabel(label))
+            filters.addWidget(cb, 1)
+        layout.addLayout(filters)
+
+        self.results = QListWidget()
+        self.results.setWordWrap(True)
+        self.results.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.results.itemDoubleClicked.connect(lambda _: self.insert_selected())
+        layout.addWidget(self.results)
+
+        self.lbl_status = QLabel()
+        layout.addWidget(self.lbl_status)
+
+        btn_row = QHBoxLayout()
+        btn_insert = QPushButton("Insert into Selected Section")
+        btn_insert.setStyleSheet("background-color: #2980b9;")
+        btn_insert.clicked.connect(self.insert_selected)
+        btn_import = QPushButton("Import CSVs...")
+        btn_import.clicked.connect(self.import_csvs)
+        btn_add_paper = QPushButton("Add Current Paper")
+        btn_add_paper.clicked.connect(self.add_current_paper)
+        btn_row.addWidget(btn_insert)
+        btn_row.addStretch()
+        btn_row.addWidget(btn_import)
+        btn_row.addWidget(btn_add_paper)
+        layout.addLayout(btn_row)
+        self.setLayout(layout)
+
+        # Search as you type, once typing pauses
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.run_search)
+        self.inp_search.textChanged.connect(self.search_timer.start)
+
+        self.refresh_filters()
+        # Default to the paper being made
+        self.cb_class.setCurrentText(app_window.metadata['class'])
+        self.cb_subject.setCurrentText(app_window.metadata['subject'])
+        for cb in (self.cb_class, self.cb_subject, self.cb_type):
+            cb.currentIndexChanged.connect(self.run_search)
+        self.run_search()
+
+    def refresh_filters(self):
+        for cb, column in ((self.cb_class, "class"), (self.cb_subject, "subject"), (self.cb_type, "type")):
+            curr = cb.currentText()
+            cb.blockSignals(True)
+            cb.clear()
+            cb.addItem("")
+            cb.addItems(self.bank.distinct(column))
+            cb.setCurrentText(curr)
+            cb.blockSignals(False)
+
+    def run_search(self):
+        t0 = time.perf_counter()
+        hits = self.bank.search(self.inp_search.text(), self.cb_class.currentText(),
+                                self.cb_subject.currentText(), self.cb_type.currentText())
+        ms = (time.perf_counter() - t0) * 1000
+
+        self.results.clear()
+        for qid, q, row in hits:
+            item = QListWidgetItem(f"[{q['type']}] {q['text']}\n    {row['class']} {row['subject']} - {row['test']} ({row['section']})")
+            item.setData(Qt.UserRole, q)
+            self.results.addItem(item)
+        self.lbl_status.setText(f"{len(hits)} shown of {self.bank.count()} questions ({ms:.1f} ms)")
+
+    def insert_selected(self):
+        s_idx = self.app_window.cb_sections.currentIndex()
+        if s_idx < 0:
+            QMessageBox.warning(self, "Error", "Add a section to the exam first.")
+            return
+        for item in self.results.selectedItems():
+            self.app_window.model.add_question(s_idx, copy.deepcopy(item.data(Qt.UserRole)))
+
+    def import_csvs(self):
+        files, _ = QFileDialog.getOpenFileNames(self, "Import Progress CSVs", "", "CSV (*.csv)")
+        if not files: return
+        self.setCursor(Qt.WaitCursor)
+        added, errors = self.bank.import_csvs(files)
+        self.unsetCursor()
+        msg = f"{added} new questions imported from {len(files) - len(errors)} files."
+        if errors: msg += "\n\nSkipped:\n" + "\n".join(f"{os.path.basename(fn)}: {err}" for fn, err in errors)
+        QMessageBox.information(self, "Import", msg)
+        self.refresh_filters()
+        self.run_search()
+
+    def add_current_paper(self):
+        added = self.bank.add_paper(self.app_window.metadata, self.app_window.sections, "current paper")
+        self.lbl_status.setText(f"{added} new questions added to the bank.")
+        self.refresh_filters()
+        self.run_search()
+
+# =============================================================================
+#    DIALOG: VARIANT SETS (shuffled A/B/C/D papers)
+# =============================================================================
+class VariantsDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Export Shuffled Sets")
+        self.setModal(True)
+
+        layout = QVBoxLayout()
+        form = QFormLayout()
+
+        self.spin_count = QSpinBox()
+        self.spin_count.setRange(2, 26)
+        self.spin_count.setValue(4)
+
+        # Shown so the same sets can be regenerated later
+        self.inp_seed = QLineEdit(str(random.randint(1000, 9999)))
+
+        self.chk_combined = QCheckBox("All sets in one PDF")
+
+        form.addRow("Number of Sets:", self.spin_count)
+        form.addRow("Seed:", self.inp_seed)
+        form.addRow("", self.chk_combined)
+        layout.addLayout(form)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def options(self):
+        return self.spin_count.value(), self.inp_seed.text().strip(), self.chk_combined.isChecked()
+
+# =============================================================================
+#    DIALOG: STUDENT PAPERS (name, roll number and QR code pre-printed)
+# =============================================================================
+class StudentsDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Export Student Papers")
+        self.setModal(True)
+
+        layout = QVBoxLayout()
+        form = QFormLayout()
+
+        self.inp_csv = QLineEdit()
+        self.inp_csv.setPlaceholderText("CSV with Name and Roll No columns")
+        btn_browse = QPushButton("Browse...")
+        btn_browse.clicked.connect(self.browse)
+        row = QHBoxLayout()
+        row.addWidget(self.inp_csv)
+        row.addWidget(btn_browse)
+
+        self.chk_per_student = QCheckBox("One PDF per student")
+
+        form.addRow("Student List:", row)
+        form.addRow("", self.chk_per_student)
+        layout.addLayout(form)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.validate_and_accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def browse(self):
+        fn, _ = QFileDialog.getOpenFileName(self, "Student List", "", "CSV (*.csv)")
+        if fn: self.inp_csv.setText(fn)
+
+    def validate_and_accept(self):
+        if not os.path.isfile(self.options()[0]):
+            QMessageBox.warning(self, "Missing", "Please choose the student list CSV.")
+            return
+        self.accept()
+
+    def options(self):
+        return self.inp_csv.text().strip(), self.chk_per_student.isChecked()
+
+# =============================================================================
+#    WORKER: PDF EXPORT (runs on a QThread, reports back through signals)
+# =============================================================================
+class ExportWorker(QObject):
+    progress = Signal(str, int, int) # message, done, total
+    finished = Signal(str, object) # file name, ExportReport
+    failed = Signal(str)
+    cancelled = Signal()
+
+    def __init__(self, fn, metadata, sections, urdu_font_path, variants=None, answer_key=False, students=None):
+        super().__init__()
+        # Snapshot, so edits made while exporting don't race the layout
+        self.fn = fn
+        self.metadata = dict(metadata)
+        self.sections = copy.deepcopy(sections)
+        self.urdu_font_path = urdu_font_path
+        self.variants = variants # (count, seed, combined) for shuffled sets
+        self.answer_key = answer_key
+        self.students = students # (csv path, per_student) for stamped papers
+        self._cancel = False
+
+    def cancel(self):
+        self._cancel = True # polled from the worker thread between sections/pages
+
+    def report(self, message, done, total):
+        if self._cancel: raise ExportCancelled()
+        self.progress.emit(message, done, total)
+
+    @Slot()
+    def run(self):
+        report = ExportReport()
+        try:
+            if self.students:
+                from stamping import export_student_papers, read_students # loads reportlab
+                csv_fn, per_student = self.students
+                files = export_student_papers(self.fn, self.metadata, self.sections, read_students(csv_fn),
+                                              self.urdu_font_path, per_student, progress=self.report,
+                                              answer_key=self.answer_key, report=report)
+                self.finished.emit(files[0], report)
+            elif self.variants:
+                count, seed, combined = self.variants
+                files, _ = export_variants(self.fn, self.metadata, self.sections, count, seed,
+                                           self.urdu_font_path, combined=combined, progress=self.report,
+                                           answer_key=self.answer_key, report=report)
+                self.finished.emit(files[0], report)
+            else:
+                export_exam_pdf(self.fn, self.metadata, self.sections, self.urdu_font_path,
+                                progress=self.report, answer_key=self.answer_key, report=report)
+                self.finished.emit(self.fn, report)
+        except ExportCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
 # =============================================================================
 #    MAIN APPLICATION
 # =============================================================================
@@ -201,16 +450,17 @@ class ExamGeneratorApp(QWidget):
     def __init__(self, metadata):
         super().__init__()
         self.metadata = metadata 
-        self.setWindowTitle(f"Pro Exam Generator - {metadata['school']}")
         self.resize(1200, 900)
         
         # Data storage
         self.sections = [] 
-        self.editing_q_ptr = None # Pointer to (section_index, question_index)
+        self.model = ExamTreeModel(self.sections, self)
+        self.editing_q_ptr = None # QPersistentModelIndex of the question being edited, follows moves
+        self.export_thread = None
+        self.bank_dialog = None # question bank is opened on first use
         
         # Font Loading
-        self.urdu_font_path = "JNN.ttf" if os.path.exists("JNN.ttf") else None
-        if not self.urdu_font_path and os.path.exists("jnn.ttf"): self.urdu_font_path = "jnn.ttf"
+        self.urdu_font_path = fonts.urdu_font()
         
         self.apply_styles()
         self.init_ui()
@@ -241,10 +491,10 @@ class ExamGeneratorApp(QWidget):
             }
             QPushButton:hover { background-color: #2c3e50; border: 1px solid #f1c40f; }
             
-            /* Tree Widget */
-            QTreeWidget { border: 1px solid #bdc3c7; background-color: #ecf0f1; }
-            QTreeWidget::item { padding: 5px; }
-            QTreeWidget::item:selected { background-color: #3498db; color: white; }
+            /* Tree View */
+            QTreeView { border: 1px solid #bdc3c7; background-color: #ecf0f1; }
+            QTreeView::item { padding: 5px; }
+            QTreeView::item:selected { background-color: #3498db; color: white; }
         """)
 
     def init_ui(self):
@@ -255,17 +505,32 @@ class ExamGeneratorApp(QWidget):
         header = QFrame()
         header.setStyleSheet("background-color: #2c3e50; border-bottom: 4px solid #f1c40f;")
         hl = QHBoxLayout(header)
-        title = QLabel(f"EXAM CREATOR | {self.metadata['class']} - {self.metadata['subject']}")
-        title.setStyleSheet("color: white; font-size: 18px; font-weight: bold;")
-        hl.addWidget(title)
+        self.lbl_title = QLabel()
+        self.lbl_title.setStyleSheet("color: white; font-size: 18px; font-weight: bold;")
+        hl.addWidget(self.lbl_title)
         
         # Export Button in Header
-        btn_export = QPushButton(f"EXPORT PDF")
-        btn_export.setCursor(Qt.PointingHandCursor)
-        btn_export.setStyleSheet("background-color: #e74c3c; font-weight: bold; border: none;")
-        btn_export.clicked.connect(self.export_pdf)
+        self.btn_export = QPushButton(f"EXPORT PDF")
+        self.btn_export.setCursor(Qt.PointingHandCursor)
+        self.btn_export.setStyleSheet("background-color: #e74c3c; font-weight: bold; border: none;")
+        self.btn_export.clicked.connect(lambda: self.export_pdf())
+        self.btn_variants = QPushButton("EXPORT SETS")
+        self.btn_variants.setCursor(Qt.PointingHandCursor)
+        self.btn_variants.setStyleSheet("background-color: #c0392b; font-weight: bold; border: none;")
+        self.btn_variants.clicked.connect(self.export_variant_sets)
+        self.btn_students = QPushButton("STUDENT PAPERS")
+        self.btn_students.setCursor(Qt.PointingHandCursor)
+        self.btn_students.setStyleSheet("background-color: #a93226; font-weight: bold; border: none;")
+        self.btn_students.setToolTip("Export the paper with each student's name, roll number and QR code printed on it")
+        self.btn_students.clicked.connect(self.export_student_papers)
+        self.chk_key = QCheckBox("Answer Key")
+        self.chk_key.setStyleSheet("color: white; font-weight: bold;")
+        self.chk_key.setToolTip("Also export <name>_Key.pdf from the same layout pass")
         hl.addStretch()
-        hl.addWidget(btn_export)
+        hl.addWidget(self.chk_key)
+        hl.addWidget(self.btn_students)
+        hl.addWidget(self.btn_variants)
+        hl.addWidget(self.btn_export)
         main_layout.addWidget(header)
 
         # --- BODY CONTENT (Splitter) ---
@@ -293,14 +558,23 @@ class ExamGeneratorApp(QWidget):
         
         rl.addWidget(QLabel("<b>Exam Structure (Drag to Reorder)</b>"))
         
-        self.tree = QTreeWidget()
+        self.tree = QTreeView()
+        self.tree.setModel(self.model)
         self.tree.setHeaderHidden(True)
+        self.tree.setUniformRowHeights(True)
         self.tree.setDragEnabled(True)
         self.tree.setAcceptDrops(True)
+        self.tree.setDropIndicatorShown(True)
         self.tree.setDragDropMode(QAbstractItemView.InternalMove)
         self.tree.setContextMenuPolicy(Qt.CustomContextMenu)
         self.tree.customContextMenuRequested.connect(self.open_context_menu)
-        self.tree.itemDoubleClicked.connect(self.on_tree_double_click)
+        self.tree.doubleClicked.connect(self.on_tree_double_click)
+
+        # The section combo only cares about top-level rows
+        self.model.rowsInserted.connect(self.on_model_rows_changed)
+        self.model.rowsRemoved.connect(self.on_model_rows_changed)
+        self.model.rowsMoved.connect(lambda parent, *rest: self.on_model_rows_changed(parent))
+        self.model.modelReset.connect(self.refresh_sections_combo)
         
         # Add Section Button
         btn_add_sec = QPushButton("+ Add New Section")
@@ -309,40 +583,70 @@ class ExamGeneratorApp(QWidget):
         
         rl.addWidget(self.tree)
         rl.addWidget(btn_add_sec)
+
+        # PREVIEW PANE: the pages as they will print, including the question being typed
+        preview_widget = QWidget()
+        pl = QVBoxLayout(preview_widget)
+        pl.setContentsMargins(0, 15, 10, 10)
+        self.lbl_preview = QLabel("<b>Preview</b>")
+        pl.addWidget(self.lbl_preview)
+        self.preview = PreviewPane(self.preview_snapshot)
+        self.preview.renderer.laid_out.connect(
+            lambda gen, keys: self.lbl_preview.setText(f"<b>Preview</b> ({len(keys)} pages)"))
+        self.preview.renderer.failed.connect(lambda err: self.lbl_preview.setText(f"<b>Preview</b> (failed: {err})"))
+        pl.addWidget(self.preview)
+        for signal in (self.model.dataChanged, self.model.rowsInserted, self.model.rowsRemoved,
+                       self.model.rowsMoved, self.model.modelReset, self.q_text.textChanged,
+                       self.col_a.textChanged, self.col_b.textChanged, self.q_type.currentTextChanged,
+                       self.cb_sections.currentIndexChanged):
+            signal.connect(self.preview.schedule)
+        for le in self.opt_inputs: le.textChanged.connect(self.preview.schedule)
         
         splitter.addWidget(scroll_area)
         splitter.addWidget(right_widget)
-        splitter.setSizes([600, 500])
+        splitter.addWidget(preview_widget)
+        splitter.setSizes([500, 350, 450])
         
         main_layout.addWidget(splitter)
         self.setLayout(main_layout)
+        self.preview.schedule() # header and empty paper
 
     # --- UI COMPONENTS ---
     def create_top_actions(self):
         bar = QHBoxLayout()
-        save_btn = QPushButton("Save Progress (.csv)")
+        save_btn = QPushButton("Save Progress")
         save_btn.clicked.connect(self.save_csv)
         save_btn.setStyleSheet("background-color: #d35400;")
         
-        load_btn = QPushButton("Load Progress (.csv)")
+        load_btn = QPushButton("Load Progress")
         load_btn.clicked.connect(self.load_csv)
         load_btn.setStyleSheet("background-color: #8e44ad;")
         
+        bank_btn = QPushButton("Question Bank")
+        bank_btn.clicked.connect(self.open_question_bank)
+        bank_btn.setStyleSheet("background-color: #16a085;")
+        
         bar.addWidget(save_btn)
         bar.addWidget(load_btn)
+        bar.addWidget(bank_btn)
         bar.addStretch()
         self.left_layout.addLayout(bar)
 
     def create_info_panel(self):
         grp = QGroupBox("Exam Metadata")
         l = QHBoxLayout()
-        info = (f"<b>Class:</b> {self.metadata['class']} | "
-                f"<b>Time:</b> {self.metadata['time']} | "
-                f"<b>Marks:</b> {self.metadata['marks']}")
-        lbl = QLabel(info)
-        l.addWidget(lbl)
+        self.lbl_info = QLabel()
+        l.addWidget(self.lbl_info)
         grp.setLayout(l)
         self.left_layout.addWidget(grp)
+        self.refresh_metadata_labels()
+
+    def refresh_metadata_labels(self):
+        self.setWindowTitle(f"Pro Exam Generator - {self.metadata['school']}")
+        self.lbl_title.setText(f"EXAM CREATOR | {self.metadata['class']} - {self.metadata['subject']}")
+        self.lbl_info.setText(f"<b>Class:</b> {self.metadata['class']} | "
+                              f"<b>Time:</b> {self.metadata['time']} | "
+                              f"<b>Marks:</b> {self.metadata['marks']}")
 
     def create_question_input_ui(self):
         grp = QGroupBox("Question Editor")
@@ -376,6 +680,11 @@ class ExamGeneratorApp(QWidget):
             le.setPlaceholderText(f"Option {chr(65+i)}")
             self.opt_inputs.append(le)
             l_mcq.addWidget(le)
+        self.cb_answer = QComboBox()
+        self.cb_answer.addItems(["Correct option: not set", "(a)", "(b)", "(c)", "(d)"])
+        l_mcq.addWidget(self.cb_answer)
+        for le in self.opt_inputs: le.textChanged.connect(self.update_answer_choices)
+        self.update_answer_choices()
         layout.addWidget(self.mcq_widget)
         
         # Match Columns
@@ -391,6 +700,15 @@ class ExamGeneratorApp(QWidget):
         l_match.addWidget(self.col_b)
         layout.addWidget(self.match_widget)
         self.match_widget.hide()
+        self.match_answer = QLineEdit()
+        self.match_answer.setPlaceholderText("Answer: Column B line for each Column A line, e.g. 2,3,1")
+        layout.addWidget(self.match_answer)
+        self.match_answer.hide()
+
+        # Answer key only, never printed on the paper
+        self.inp_notes = QLineEdit()
+        self.inp_notes.setPlaceholderText("Marking notes for the answer key (optional)")
+        layout.addWidget(self.inp_notes)
         
         # Buttons
         btn_row = QHBoxLayout()
@@ -413,6 +731,15 @@ class ExamGeneratorApp(QWidget):
     def toggle_inputs(self, txt):
         self.mcq_widget.setVisible(txt == "MCQ")
         self.match_widget.setVisible(txt == "Match Columns")
+        self.match_answer.setVisible(txt == "Match Columns")
+
+    def update_answer_choices(self):
+        """Only filled options can be picked as the correct one"""
+        items = self.cb_answer.model()
+        for i, le in enumerate(self.opt_inputs):
+            items.item(i + 1).setEnabled(bool(le.text().strip()))
+        if self.cb_answer.currentIndex() > 0 and not items.item(self.cb_answer.currentIndex()).isEnabled():
+            self.cb_answer.setCurrentIndex(0)
 
     # --- LOGIC & TREE MANAGEMENT ---
     
@@ -423,84 +750,24 @@ class ExamGeneratorApp(QWidget):
             self.cb_sections.addItem(s['name'])
         self.cb_sections.setCurrentText(curr)
 
-    def rebuild_tree(self):
-        """Syncs the visual TreeWidget with self.sections data"""
-        self.tree.clear()
-        for s_idx, sec in enumerate(self.sections):
-            sec_item = QTreeWidgetItem(self.tree)
-            sec_item.setText(0, f"{sec['name']} - {sec['desc']} ({sec['total_marks']} marks)")
-            sec_item.setData(0, Qt.UserRole, "SECTION")
-            sec_item.setData(0, Qt.UserRole+1, s_idx)
-            
-            font = QFont(); font.setBold(True); sec_item.setFont(0, font)
-            sec_item.setBackground(0, QColor("#dfe6e9"))
-            
-            for q_idx, q in enumerate(sec['questions']):
-                q_item = QTreeWidgetItem(sec_item)
-                display_text = q['text'][:50] + "..." if len(q['text']) > 50 else q['text']
-                q_item.setText(0, f"Q{q_idx+1}: {display_text}")
-                q_item.setData(0, Qt.UserRole, "QUESTION")
-                q_item.setData(0, Qt.UserRole+1, q) # Store actual question data temporarily
-            
-            sec_item.setExpanded(True)
-        self.refresh_sections_combo()
+    def on_model_rows_changed(self, parent, *rest):
+        if not parent.isValid(): self.refresh_sections_combo()
 
-    def sync_tree_to_model(self):
-        """Scrapes the TreeWidget to update self.sections (handles reordering)"""
-        new_sections = []
-        root = self.tree.invisibleRootItem()
-        
-        for i in range(root.childCount()):
-            sec_item = root.child(i)
-            role = sec_item.data(0, Qt.UserRole)
-            
-            # If a question was dragged to root, ignore or handle (here we ignore/warn in logic)
-            if role != "SECTION": continue
-            
-            s_idx = sec_item.data(0, Qt.UserRole+1)
-            # Retrieve original section metadata (metadata might be stale if reordered, 
-            # so ideally we look up by ID or keep existing object. 
-            # Simplified: we use the stored index to fetch original metadata)
-            
-            # However, if we deleted/added, indices change. 
-            # Better approach: The tree represents the truth for order.
-            # We need to match the tree item back to the original section data.
-            original_sec_data = self.sections[s_idx]
-            
-            new_questions = []
-            for j in range(sec_item.childCount()):
-                q_item = sec_item.child(j)
-                # The question data is stored in UserRole+1
-                q_data = q_item.data(0, Qt.UserRole+1)
-                new_questions.append(q_data)
-            
-            original_sec_data['questions'] = new_questions
-            new_sections.append(original_sec_data)
-            
-            # Update index for next time
-            sec_item.setData(0, Qt.UserRole+1, i) 
-            
-        self.sections = new_sections
-        self.refresh_sections_combo()
-
-    def open_section_dialog(self, existing_data=None):
+    def open_section_dialog(self, existing_data=None, s_idx=-1):
         dlg = SectionSetupDialog(self, existing_data)
         if dlg.exec():
             if existing_data:
-                # Update logic
-                # Find which section we are editing based on object reference or selection
-                # Since we pass dict reference, updating it directly works if list structure holds
+                # Section dicts are updated in place, the model keeps pointing at them
                 existing_data.update(dlg.section_data)
+                self.model.section_changed(s_idx)
+                self.refresh_sections_combo()
             else:
-                self.sections.append(dlg.section_data)
-            self.rebuild_tree()
+                self.tree.expand(self.model.add_section(dlg.section_data))
 
-    def save_question_input(self):
-        # 1. Sync tree first to ensure indices are current
-        self.sync_tree_to_model()
-        
+    def question_from_inputs(self):
+        """The editor's question as printed (no answer/notes), None while empty"""
         raw_text = self.q_text.toPlainText().strip()
-        if not raw_text: return
+        if not raw_text: return None
 
         q = {
             "type": self.q_type.currentText(),
@@ -512,45 +779,92 @@ class ExamGeneratorApp(QWidget):
         elif q["type"] == "Match Columns":
             q["col_a"] = [x for x in self.col_a.toPlainText().split('\n') if x.strip()]
             q["col_b"] = [x for x in self.col_b.toPlainText().split('\n') if x.strip()]
+        return q
+
+    def preview_snapshot(self):
+        """What the preview lays out: the paper with the editor's question in
+        place (replacing the one being edited, or at the end of its section).
+        Question lists are copied, the question dicts are never edited in place.
+        Project sections not decoded yet are decoded on the preview's thread."""
+        sections = [dict(sec, questions=sec['questions'].snapshot() if isinstance(sec['questions'], LazyQuestions)
+                         else list(sec['questions'])) for sec in self.sections]
+        q = self.question_from_inputs()
+        if q:
+            ptr = self.editing_q_ptr
+            s_idx = ptr.parent().row() if ptr and ptr.isValid() else self.cb_sections.currentIndex()
+            if 0 <= s_idx < len(sections):
+                questions = sections[s_idx]['questions'] = list(self.sections[s_idx]['questions'])
+                if ptr and ptr.isValid(): questions[ptr.row()] = q
+                else: questions.append(q)
+        return dict(self.metadata), sections, self.urdu_font_path
+
+    def save_question_input(self):
+        q = self.question_from_inputs()
+        if not q: return
+
+        if q["type"] == "MCQ":
+            ans = self.cb_answer.currentIndex() - 1
+            if ans >= 0:
+                if not q["options"][ans].strip():
+                    QMessageBox.warning(self, "Error", f"The correct option ({'abcd'[ans]}) is blank.")
+                    return
+                q["answer"] = ans
+        elif q["type"] == "Match Columns":
+            pairs = [x for x in self.match_answer.text().replace(' ', '').split(',') if x]
+            if pairs:
+                try:
+                    ans = [int(x) - 1 for x in pairs]
+                    if len(ans) != len(q["col_a"]) or not all(0 <= i < len(q["col_b"]) for i in ans): raise ValueError
+                except ValueError:
+                    QMessageBox.warning(self, "Error", "Answer needs one Column B line number per Column A line.")
+                    return
+                q["answer"] = ans
+        if self.inp_notes.text().strip(): q["notes"] = self.inp_notes.text().strip()
 
         if self.editing_q_ptr:
-            # Update existing
-            s_idx, q_idx = self.editing_q_ptr
-            self.sections[s_idx]['questions'][q_idx] = q
+            # Update existing (the persistent index followed any drag since it was loaded)
+            ptr = self.editing_q_ptr
+            if not ptr.isValid():
+                QMessageBox.warning(self, "Error", "The question being edited was deleted.")
+                self.reset_editor()
+                return
+            self.model.update_question(ptr.parent().row(), ptr.row(), q)
             self.editing_q_ptr = None
             self.btn_save_q.setText("Add Question")
             self.btn_cancel.hide()
         else:
             # Add new
-            sec_name = self.cb_sections.currentText()
-            # Find section index
-            target = next((s for s in self.sections if s['name'] == sec_name), None)
-            if target:
-                target['questions'].append(q)
-            else:
+            s_idx = self.cb_sections.currentIndex()
+            if s_idx < 0:
                 QMessageBox.warning(self, "Error", "No Section Selected/Exists")
                 return
+            self.model.add_question(s_idx, q)
 
+        self.clear_answer_inputs()
         self.q_text.clear()
         self.col_a.clear(); self.col_b.clear()
         for o in self.opt_inputs: o.clear()
-        self.rebuild_tree()
+
+    def clear_answer_inputs(self):
+        self.cb_answer.setCurrentIndex(0)
+        self.match_answer.clear()
+        self.inp_notes.clear()
 
     def reset_editor(self):
         self.editing_q_ptr = None
         self.btn_save_q.setText("Add Question")
         self.btn_cancel.hide()
         self.q_text.clear()
+        self.clear_answer_inputs()
 
     # --- TREE INTERACTION ---
     def open_context_menu(self, position):
-        item = self.tree.itemAt(position)
-        if not item: return
+        item = self.tree.indexAt(position)
+        if not item.isValid(): return
         
         menu = QMenu()
-        role = item.data(0, Qt.UserRole)
         
-        if role == "SECTION":
+        if self.model.is_section(item):
             act_edit = QAction("Edit Section Details", self)
             act_edit.triggered.connect(lambda: self.edit_section_from_tree(item))
             menu.addAction(act_edit)
@@ -558,7 +872,7 @@ class ExamGeneratorApp(QWidget):
             act_del = QAction("Delete Section", self)
             act_del.triggered.connect(lambda: self.delete_item(item))
             menu.addAction(act_del)
-        elif role == "QUESTION":
+        else:
             act_edit = QAction("Edit Question", self)
             act_edit.triggered.connect(lambda: self.load_question_for_edit(item))
             menu.addAction(act_edit)
@@ -570,280 +884,207 @@ class ExamGeneratorApp(QWidget):
         menu.exec(self.tree.viewport().mapToGlobal(position))
 
     def edit_section_from_tree(self, item):
-        s_idx = item.data(0, Qt.UserRole+1)
-        self.open_section_dialog(self.sections[s_idx])
+        s_idx = item.row()
+        self.open_section_dialog(self.sections[s_idx], s_idx)
 
-    def on_tree_double_click(self, item, col):
-        if item.data(0, Qt.UserRole) == "QUESTION":
+    def on_tree_double_click(self, item):
+        if not self.model.is_section(item):
             self.load_question_for_edit(item)
 
     def load_question_for_edit(self, item):
-        self.sync_tree_to_model() # Save current state
+        q = self.model.question(item)
         
-        parent = item.parent()
-        s_idx = parent.data(0, Qt.UserRole+1)
-        q_idx = parent.indexOfChild(item)
-        
-        q = self.sections[s_idx]['questions'][q_idx]
-        
-        self.editing_q_ptr = (s_idx, q_idx)
-        self.cb_sections.setCurrentIndex(s_idx)
+        self.editing_q_ptr = QPersistentModelIndex(item)
+        self.cb_sections.setCurrentIndex(item.parent().row())
         self.q_type.setCurrentText(q['type'])
         self.q_text.setText(q['text'])
         
+        self.clear_answer_inputs()
         if q['type'] == "MCQ":
             opts = q.get('options', [])
             for i, le in enumerate(self.opt_inputs):
                 if i < len(opts): le.setText(opts[i])
+            if q.get('answer') is not None: self.cb_answer.setCurrentIndex(q['answer'] + 1)
         elif q['type'] == "Match Columns":
             self.col_a.setText("\n".join(q.get('col_a', [])))
             self.col_b.setText("\n".join(q.get('col_b', [])))
+            if q.get('answer'): self.match_answer.setText(",".join(str(i + 1) for i in q['answer']))
+        self.inp_notes.setText(q.get('notes', ''))
 
         self.btn_save_q.setText("Update Question")
         self.btn_cancel.show()
 
     def delete_item(self, item):
-        parent = item.parent()
-        if parent: 
-            # It's a question
-            parent.removeChild(item)
+        if self.model.is_section(item):
+            self.model.remove_section(item.row())
         else:
-            # It's a section
-            index = self.tree.indexOfTopLevelItem(item)
-            self.tree.takeTopLevelItem(index)
-        self.sync_tree_to_model()
+            self.model.remove_question(item.parent().row(), item.row())
 
     # --- FILE I/O ---
     def save_csv(self):
-        self.sync_tree_to_model()
-        fn, _ = QFileDialog.getSaveFileName(self, "Save", "", "CSV (*.csv)")
+        fn, _ = QFileDialog.getSaveFileName(self, "Save", "", PROJECT_FILTER)
         if fn:
             try:
-                with open(fn, 'w', newline='', encoding='utf-8') as f:
-                    w = csv.writer(f)
-                    md = self.metadata
-                    w.writerow(["META", md['school'], md['test'], md['class'], md['subject'], md['time'], md['marks']])
-                    for s in self.sections:
-                        w.writerow(["SEC", s['name'], s['desc'], s['marks_per_q'], s['attempt_count']])
-                        for q in s['questions']:
-                            row = ["Q", q['type'], q['text']]
-                            if q['type'] == "MCQ": row += q.get('options', [])
-                            elif q['type'] == "Match Columns": 
-                                row += ["|".join(q.get('col_a', [])), "|".join(q.get('col_b', []))]
-                            w.writerow(row)
+                if is_project(fn): write_project(fn, self.metadata, self.sections)
+                else: write_exam_csv(fn, self.metadata, self.sections)
                 QMessageBox.information(self, "Saved", "Progress saved successfully.")
             except Exception as e: 
                 QMessageBox.critical(self, "Error", str(e))
 
     def load_csv(self):
-        fn, _ = QFileDialog.getOpenFileName(self, "Load", "", "CSV (*.csv)")
-        if fn:
-            self.sections = []
-            curr_sec = None
+        fn, _ = QFileDialog.getOpenFileName(self, "Load", "", PROJECT_FILTER)
+        if not fn: return
+        report = ReadReport()
+        try:
+            # Project files only decode a section's questions when it is shown
+            if is_project(fn):
+                metadata, sections = read_project(fn)
+                report.has_metadata = True
+            else:
+                metadata, sections = read_exam_csv(fn, report)
+        except Exception as e:
+            QMessageBox.critical(self, "Load Error", f"Could not read {os.path.basename(fn)}:\n{e}")
+            return
+
+        if report.has_metadata: self.metadata = metadata # older files may not have one
+        self.sections = sections
+        self.model.set_sections(self.sections)
+        if is_project(fn):
+            # Expanding decodes a section, so only the first one is opened
+            if self.sections: self.tree.expand(self.model.index(0, 0))
+        else:
+            self.tree.expandAll()
+        self.refresh_metadata_labels()
+
+        if report.errors:
+            shown = report.errors[:20]
+            details = "\n".join(f"Line {err.line}: {err.message}" for err in shown)
+            if len(report.errors) > len(shown): details += f"\n... and {len(report.errors) - len(shown)} more"
+            self.show_message(QMessageBox.Warning, "Loaded with problems", f"{report.summary()}\n\n{details}")
+
+    # --- QUESTION BANK ---
+    def open_question_bank(self):
+        if not self.bank_dialog:
             try:
-                with open(fn, 'r', encoding='utf-8') as f:
-                    r = csv.reader(f)
-                    for row in r:
-                        if not row: continue
-                        if row[0] == "META":
-                            # Ideally update metadata here, for now keeping simple
-                            pass
-                        elif row[0] == "SEC":
-                            curr_sec = {
-                                "name": row[1], "desc": row[2], 
-                                "marks_per_q": int(row[3]), "attempt_count": int(row[4]),
-                                "total_marks": int(row[3])*int(row[4]), "questions": []
-                            }
-                            self.sections.append(curr_sec)
-                        elif row[0] == "Q" and curr_sec:
-                            q = {"type": row[1], "text": row[2]}
-                            if q['type'] == "MCQ": q['options'] = row[3:]
-                            elif q['type'] == "Match Columns": 
-                                q['col_a'] = row[3].split('|')
-                                q['col_b'] = row[4].split('|')
-                            curr_sec['questions'].append(q)
-                self.rebuild_tree()
+                self.bank_dialog = QuestionBankDialog(self, QuestionBank())
             except Exception as e:
-                print(e)
-
-    # --- PDF EXPORT (UPDATED FOR FONT/SPACING) ---
-    def process_text(self, text):
-        if not HAS_URDU_LIB or not text: return text, None, False
-        is_urdu = bool(re.search('[\u0600-\u06FF]', text))
-        if is_urdu:
-            reshaped = arabic_reshaper.reshape(text)
-            bidi = get_display(reshaped)
-            prop = fm.FontProperties(fname=self.urdu_font_path) if self.urdu_font_path else None
-            return bidi, prop, True
-        return text, None, False
-
-    def export_pdf(self):
-        self.sync_tree_to_model()
+                QMessageBox.critical(self, "Question Bank", str(e))
+                return
+        self.bank_dialog.show()
+        self.bank_dialog.raise_()
+
+    # --- PDF EXPORT ---
+    def export_variant_sets(self):
+        if self.export_thread: return
+        dlg = VariantsDialog(self)
+        if dlg.exec(): self.export_pdf(dlg.options())
+
+    def export_student_papers(self):
+        if self.export_thread: return
+        dlg = StudentsDialog(self)
+        if dlg.exec(): self.export_pdf(students=dlg.options())
+
+    def export_pdf(self, variants=None, students=None):
+        if self.export_thread: return # one export at a time
         fn, _ = QFileDialog.getSaveFileName(self, "Export PDF", f"{self.metadata['subject']}_Exam.pdf", "PDF (*.pdf)")
         if not fn: return
 
-        try:
-            # === UPDATED CONSTANTS ===
-            PAGE_W, PAGE_H = 8.27, 11.69
-            MARGIN_X, MARGIN_TOP, MARGIN_BTM = 0.5, 0.5, 0.5
-            CONTENT_W = PAGE_W - (2 * MARGIN_X)
-            
-            # Increased Font Sizes by 1-2px approx (1 pt ~ 1.3px, keeping logical scale)
-            FS_HEADER, FS_SUB, FS_BODY = 18, 14, 12 
-            
-            # Reduced Line Height (0.25 -> 0.21)
-            LH = 0.21 
-
-            with PdfPages(fn) as pdf:
-                def new_page():
-                    fig = plt.figure(figsize=(PAGE_W, PAGE_H))
-                    ax = fig.add_axes([0, 0, 1, 1]) 
-                    ax.set_xlim(0, PAGE_W); ax.set_ylim(0, PAGE_H); ax.axis('off')
-                    return fig, ax
-
-                def draw_text(ax, x, y, txt, fs=12, weight='normal', align='left', v_align='baseline', force_rtl=True):
-                    final_txt, font_prop, is_urdu = self.process_text(txt)
-                    eff_x, eff_align = x, align
-                    eff_fs = fs
-
-                    if is_urdu:
-                        weight = 'normal' # Urdu fonts usually don't support matplotlib bold weights well
-                        eff_fs += 1 # Increase Urdu font slightly more for readability
-                        if force_rtl:
-                            if align == 'left': eff_align, eff_x = 'right', PAGE_W - x
-                            elif align == 'right': eff_align, eff_x = 'left', PAGE_W - x
-
-                    kwargs = {'fontsize': eff_fs, 'fontweight': weight, 'ha': eff_align, 'va': v_align}
-                    if font_prop: kwargs['fontproperties'] = font_prop
-                    ax.text(eff_x, y, final_txt, **kwargs)
-                    return is_urdu
-
-                fig, ax = new_page()
-                cursor_y = PAGE_H - MARGIN_TOP
-
-                # --- HEADER ---
-                H_BOX_H = 2.0
-                p_box = FancyBboxPatch((MARGIN_X, cursor_y - H_BOX_H), CONTENT_W, H_BOX_H,
-                                       boxstyle="round,pad=0.1", ec="black", fc="white", lw=2)
-                ax.add_patch(p_box)
-                
-                cx = PAGE_W / 2
-                draw_text(ax, cx, cursor_y - 0.3, self.metadata['school'], FS_HEADER, 'bold', 'center')
-                draw_text(ax, cx, cursor_y - 0.6, self.metadata['test'], FS_SUB, 'bold', 'center')
-                
-                rule_y = cursor_y - 0.8
-                ax.plot([MARGIN_X + 0.2, PAGE_W - MARGIN_X - 0.2], [rule_y, rule_y], color='black', lw=1)
-                
-                meta_y = rule_y - 0.3
-                draw_text(ax, MARGIN_X + 0.2, meta_y, f"Class: {self.metadata['class']}", FS_BODY)
-                draw_text(ax, cx + 0.5, meta_y, f"Time: {self.metadata['time']}", FS_BODY)
-                
-                meta_y -= 0.25
-                draw_text(ax, MARGIN_X + 0.2, meta_y, f"Subject: {self.metadata['subject']}", FS_BODY)
-                draw_text(ax, cx + 0.5, meta_y, f"Marks: {self.metadata['marks']}", FS_BODY)
-
-                name_y = meta_y - 0.35
-                draw_text(ax, MARGIN_X + 0.2, name_y, "Name: __________________________", FS_BODY)
-                draw_text(ax, cx + 0.5, name_y, "Roll No: ____________", FS_BODY)
-                
-                cursor_y -= (H_BOX_H + 0.3)
-
-                # --- SECTIONS ---
-                for sec in self.sections:
-                    if cursor_y < MARGIN_BTM + 1.0:
-                        pdf.savefig(fig); plt.close(); fig, ax = new_page(); cursor_y = PAGE_H - MARGIN_TOP
-                    
-                    # Section Header
-                    SEC_H = 0.4
-                    p_sec = FancyBboxPatch((MARGIN_X, cursor_y - SEC_H), CONTENT_W, SEC_H,
-                                           boxstyle="round,pad=0.05", ec="black", fc="#ecf0f1", lw=1)
-                    ax.add_patch(p_sec)
-                    
-                    sy = cursor_y - 0.25
-                    title = f"{sec['name']}   {sec['desc']}"
-                    marks = f"({sec['marks_per_q']} x {sec['attempt_count']} = {sec['total_marks']})"
-                    
-                    draw_text(ax, MARGIN_X + 0.1, sy, title, FS_BODY, 'bold')
-                    draw_text(ax, PAGE_W - MARGIN_X - 0.1, sy, marks, FS_BODY, 'bold', 'right')
-                    
-                    cursor_y -= (SEC_H + 0.2)
-
-                    # Questions
-                    for idx, q in enumerate(sec['questions']):
-                        q_num = f"{idx+1}."
-                        lines = textwrap.wrap(q['text'], width=80) # Slightly reduced width for larger font
-                        
-                        # Estimate Height
-                        req_h = (len(lines) * LH) + 0.15
-                        if q['type'] == "MCQ": req_h += 0.8
-                        if q['type'] == "Match Columns": req_h += 1.5
-                        
-                        if cursor_y - req_h < MARGIN_BTM:
-                            pdf.savefig(fig); plt.close(); fig, ax = new_page(); cursor_y = PAGE_H - MARGIN_TOP
-
-                        # Render Text
-                        _, _, is_urdu_q = self.process_text(q['text'])
-                        
-                        if is_urdu_q:
-                            draw_text(ax, MARGIN_X, cursor_y, q_num, FS_BODY, 'bold', 'left', 'top', False)
-                            anchor = PAGE_W - MARGIN_X - 0.1
-                            for ln in lines:
-                                draw_text(ax, anchor, cursor_y, ln, FS_BODY, 'normal', 'right', 'top', False)
-                                cursor_y -= LH
-                        else:
-                            draw_text(ax, MARGIN_X, cursor_y, q_num, FS_BODY, 'bold', 'left', 'top', False)
-                            anchor = MARGIN_X + 0.5
-                            for ln in lines:
-                                draw_text(ax, anchor, cursor_y, ln, FS_BODY, 'normal', 'left', 'top', False)
-                                cursor_y -= LH
-                        
-                        # Render Options
-                        cursor_y -= 0.1
-                        if q['type'] == "MCQ":
-                            opts = q.get('options', [])
-                            opt_y = cursor_y
-                            if is_urdu_q:
-                                # Urdu Layout (Right aligned)
-                                if len(opts)>0: draw_text(ax, anchor, opt_y, f"{opts[0]} (a)", FS_BODY, 'normal', 'right', 'baseline', False)
-                                if len(opts)>2: draw_text(ax, anchor, opt_y-LH, f"{opts[2]} (c)", FS_BODY, 'normal', 'right', 'baseline', False)
-                                if len(opts)>1: draw_text(ax, anchor-3.5, opt_y, f"{opts[1]} (b)", FS_BODY, 'normal', 'right', 'baseline', False)
-                                if len(opts)>3: draw_text(ax, anchor-3.5, opt_y-LH, f"{opts[3]} (d)", FS_BODY, 'normal', 'right', 'baseline', False)
-                                cursor_y = opt_y - (2*LH) - 0.15
-                            else:
-                                # English Layout
-                                if len(opts)>0: draw_text(ax, anchor, opt_y, f"(a) {opts[0]}", FS_BODY)
-                                if len(opts)>1: draw_text(ax, anchor+3.5, opt_y, f"(b) {opts[1]}", FS_BODY)
-                                opt_y -= LH
-                                if len(opts)>2: draw_text(ax, anchor, opt_y, f"(c) {opts[2]}", FS_BODY)
-                                if len(opts)>3: draw_text(ax, anchor+3.5, opt_y, f"(d) {opts[3]}", FS_BODY)
-                                cursor_y = opt_y - 0.2
-
-                        elif q['type'] == "Match Columns":
-                            col_a, col_b = q.get('col_a', []), q.get('col_b', [])
-                            draw_text(ax, MARGIN_X+1, cursor_y, "Column A", FS_BODY, 'bold')
-                            draw_text(ax, MARGIN_X+4, cursor_y, "Column B", FS_BODY, 'bold')
-                            cursor_y -= LH
-                            for i in range(max(len(col_a), len(col_b))):
-                                if i < len(col_a): draw_text(ax, MARGIN_X+1, cursor_y, col_a[i], FS_BODY)
-                                if i < len(col_b): draw_text(ax, MARGIN_X+4, cursor_y, col_b[i], FS_BODY)
-                                cursor_y -= LH
-                            cursor_y -= 0.2
-
-                pdf.savefig(fig)
-                plt.close()
-            
-            QMessageBox.information(self, "Success", f"PDF Generated:\n{fn}")
-            try: os.startfile(fn)
-            except: pass
+        self.export_dialog = QProgressDialog("Preparing export...", "Cancel", 0, 0, self)
+        self.export_dialog.setWindowTitle("Exporting PDF")
+        self.export_dialog.setWindowModality(Qt.WindowModal)
+        self.export_dialog.setMinimumDuration(300)
+        self.export_dialog.setAutoClose(False)
+        self.export_dialog.setAutoReset(False)
+
+        self.export_thread = QThread(self)
+        self.export_worker = ExportWorker(fn, self.metadata, self.sections, self.urdu_font_path, variants,
+                                          self.chk_key.isChecked(), students)
+        self.export_worker.moveToThread(self.export_thread)
+        self.export_thread.started.connect(self.export_worker.run)
+        self.export_worker.progress.connect(self.on_export_progress)
+        self.export_worker.finished.connect(self.on_export_finished)
+        self.export_worker.failed.connect(self.on_export_failed)
+        self.export_worker.cancelled.connect(self.on_export_cancelled)
+        # Direct: the worker thread is busy in run() and never processes queued calls
+        self.export_dialog.canceled.connect(self.export_worker.cancel, Qt.DirectConnection)
+
+        self.btn_export.setEnabled(False)
+        self.btn_variants.setEnabled(False)
+        self.btn_students.setEnabled(False)
+        self.export_thread.start()
+
+    def on_export_progress(self, message, done, total):
+        self.export_dialog.setLabelText(message)
+        self.export_dialog.setMaximum(total)
+        self.export_dialog.setValue(done)
+
+    def on_export_finished(self, fn, report):
+        self.end_export()
+        text = f"PDF Generated:\n{fn}\n\n{report.summary()}"
+        trace = tracing.save() # everything traced this session, preview included
+        if trace: text += f"\nTrace: {trace}"
+        self.show_message(QMessageBox.Information, "Success", text)
+        QDesktopServices.openUrl(QUrl.fromLocalFile(fn)) # os.startfile is Windows-only
+
+    def on_export_failed(self, error):
+        self.end_export()
+        self.show_message(QMessageBox.Critical, "PDF Error", error)
+
+    def on_export_cancelled(self):
+        self.end_export()
+
+    def end_export(self):
+        self.export_dialog.close()
+        self.export_thread.quit()
+        self.export_thread.wait()
+        self.export_worker.deleteLater()
+        self.export_thread.deleteLater()
+        self.export_thread = None
+        self.btn_export.setEnabled(True)
+        self.btn_variants.setEnabled(True)
+        self.btn_students.setEnabled(True)
+
+    def closeEvent(self, event):
+        self.preview.stop()
+        super().closeEvent(event)
+
+    def show_message(self, icon, title, text):
+        # Non-blocking, the window stays usable while the box is up
+        box = QMessageBox(icon, title, text, QMessageBox.Ok, self)
+        box.setAttribute(Qt.WA_DeleteOnClose)
+        box.open()
+
+# =============================================================================
+#    STARTUP
+# =============================================================================
+def warm_up_render_stack():
+    warm_up(DEFAULT_BACKEND, fonts.urdu_font())
+    startup.mark("render stack warm (background)")
+
+
+def on_first_dialog_shown(warm, setup):
+    startup.mark("setup dialog shown")
+    warm.start()
+    if startup.ENABLED:
+        # Measurement run: wait for the warm-up, report and quit
+        warm.join()
+        startup.report()
+        setup.reject()
 
-        except Exception as e:
-            QMessageBox.critical(self, "PDF Error", str(e))
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # variant layout workers in the frozen exe
+    if "--trace" in sys.argv[:-1]: # python main.py --trace trace.json (or set PAPERIFY_TRACE)
+        tracing.enable(sys.argv[sys.argv.index("--trace") + 1])
+    startup.mark("imports done")
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
-    
+    startup.mark("QApplication created")
+
+    # The render stack loads in the background while the user fills the first dialog
+    warm = threading.Thread(target=warm_up_render_stack, name="warm-up", daemon=True)
     setup = SetupDetailsDialog()
+    QTimer.singleShot(0, lambda: on_first_dialog_shown(warm, setup))
     if setup.exec():
         window = ExamGeneratorApp(setup.data)
         window.show()
@@ -1,11 +1,25 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+# Prebuild matplotlib's font list so the first launch doesn't rescan the system fonts
+mpl_cache = os.path.join(workpath, 'mpl-cache')
+subprocess.run([sys.executable, os.path.join(SPECPATH, 'fonts.py'), '--build-cache', mpl_cache], check=True)
 
 
 a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('JNN.ttf', '.')],
+    datas=[
+        ('JNN.ttf', '.'),
+        ('NotoNastaliqUrdu-VariableFont_wght.ttf', '.'),
+        ('NotoNaskhArabic-VariableFont_wght.ttf', '.'),
+        ('times.ttf', '.'),
+        ('OFL.txt', '.'),
+        (mpl_cache, 'mpl-cache'),
+    ],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,51 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import matplotlib
+from matplotlib.path import Path
+from matplotlib.textpath import TextPath
+
+from metrics import MATH_LOCK, font_properties
+from tracing import traced
+
+FORMULA_CACHE_SIZE = 4096
+
+# =============================================================================
+#    FORMULA CACHE ($...$ typeset once, stamped wherever it appears)
+# =============================================================================
+# `ops` is the outline in points relative to the baseline origin, already
+# reduced to PDF path operators: ('m', x, y), ('l', x, y),
+# ('c', x1, y1, x2, y2, x3, y3) and ('h',). `bbox` is (x0, y0, x1, y1).
+Formula = namedtuple("Formula", "ops bbox")
+
+
+@lru_cache(maxsize=FORMULA_CACHE_SIZE)
+@traced("typeset_formula")
+def _typeset(expr, font, fs, weight, fontset):
+    with MATH_LOCK:
+        path = TextPath((0, 0), expr, prop=font_properties(font, fs, weight))
+    ops = []
+    last = (0, 0)
+    for verts, code in path.iter_segments(curves=True, simplify=False):
+        pts = verts.reshape(-1, 2)
+        if code == Path.MOVETO: ops.append(('m', *pts[0]))
+        elif code == Path.LINETO: ops.append(('l', *pts[0]))
+        elif code == Path.CURVE3:
+            # Quadratic -> cubic control points
+            (qx, qy), (ex, ey) = pts
+            ops.append(('c', last[0] + 2/3 * (qx - last[0]), last[1] + 2/3 * (qy - last[1]),
+                        ex + 2/3 * (qx - ex), ey + 2/3 * (qy - ey), ex, ey))
+        elif code == Path.CURVE4: ops.append(('c', *pts.ravel()))
+        elif code == Path.CLOSEPOLY: ops.append(('h',))
+        last = pts[-1]
+    ext = path.get_extents()
+    return Formula(tuple(ops), (ext.x0, ext.y0, ext.x1, ext.y1))
+
+
+def formula(expr, font=None, fs=12, weight='normal'):
+    """Typesets a $...$ expression, keyed by expression, size and mathtext fontset"""
+    return _typeset(expr, font, fs, weight, matplotlib.rcParams['mathtext.fontset'])
+
+
+def formula_cache_info():
+    return _typeset.cache_info()
@@ -0,0 +1,99 @@
+import re
+import threading
+from functools import lru_cache
+
+import matplotlib
+from matplotlib import font_manager as fm
+from matplotlib import ft2font
+from matplotlib.textpath import TextToPath
+
+from shaping import script_runs
+from tracing import traced
+
+# --- PDF SETTINGS (shared by the layout and both renderers) ---
+matplotlib.rcParams['font.family'] = 'serif'
+matplotlib.rcParams['mathtext.fontset'] = 'cm'
+matplotlib.rcParams['axes.unicode_minus'] = False
+
+PT = 72 # points per inch
+
+# A token is a run of non-space characters, with $...$ spans kept whole
+TOKEN_RE = re.compile(r'(?:\$[^$]*\$|\S)+')
+
+_text_to_path = TextToPath()
+
+# matplotlib built with libraqm (3.11+) lays out right-to-left text itself
+MPL_DOES_BIDI = hasattr(ft2font, "__libraqm_version__")
+
+# matplotlib's mathtext parser is shared and not thread-safe, and the preview
+# lays out on its own thread while an export runs
+MATH_LOCK = threading.Lock()
+
+# =============================================================================
+#    TEXT METRICS (font advance widths, cached)
+# =============================================================================
+@lru_cache(maxsize=None)
+def font_properties(font, fs, weight='normal'):
+    """`font` is a TTF path, or None for the default serif face"""
+    if font: return fm.FontProperties(fname=font, size=fs)
+    return fm.FontProperties(family='serif', weight=weight, size=fs)
+
+
+def is_math(text):
+    # Same rule as matplotlib: an even, non-zero number of unescaped dollars
+    dollars = text.count('$') - text.count(r'\$')
+    return dollars > 0 and dollars % 2 == 0
+
+
+@lru_cache(maxsize=65536)
+@traced("text_extent")
+def text_extent(text, font, fs, weight='normal'):
+    """Returns (width, height, descent) in points"""
+    prop = font_properties(font, fs, weight)
+    if not is_math(text):
+        return _text_to_path.get_text_width_height_descent(text, prop, ismath=False)
+    with MATH_LOCK:
+        return _text_to_path.get_text_width_height_descent(text, prop, ismath=True)
+
+
+def mpl_text(text, font):
+    """A run as matplotlib must be given it to draw it as shaped: Urdu runs
+    (drawn with a `font`, no Latin letters or digits) are already in display
+    order, so go to a bidi-aware matplotlib reversed"""
+    return text[::-1] if MPL_DOES_BIDI and font else text
+
+
+def text_width(text, font, fs, weight='normal'):
+    return text_extent(text, font, fs, weight)[0]
+
+
+def runs_width(runs, fs, weight='normal'):
+    """Width of (segment, font) runs drawn one after the other, in points"""
+    return sum(text_width(seg, font, fs, weight) for seg, font in runs)
+
+
+@lru_cache(maxsize=None)
+def space_width(font, fs, weight='normal'):
+    return text_width("n n", font, fs, weight) - text_width("nn", font, fs, weight)
+
+
+@traced("wrap_text")
+def wrap_text(text, max_w, fs, font=None, weight='normal', shaped=False):
+    """Greedy word wrap against max_w inches using real glyph widths.
+
+    `shaped` measures each word as drawn: its script runs (Urdu reshaped, in
+    `font`; English and math in the default face).
+    """
+    limit = max_w * PT
+    space = space_width(font, fs, weight)
+    lines, line, line_w = [], [], 0
+    for token in TOKEN_RE.findall(text):
+        if shaped: w = runs_width(script_runs(token, font), fs, weight)
+        else: w = text_width(token, font, fs, weight)
+        if line and line_w + space + w > limit:
+            lines.append(" ".join(line))
+            line, line_w = [], 0
+        line_w += (space + w) if line else w
+        line.append(token)
+    if line: lines.append(" ".join(line))
+    return lines
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import pickle
+import sys
+
+# =============================================================================
+#    PAGE CACHE (rendered page content on disk, keyed by a hash of the page)
+# =============================================================================
+# A page is a list of namedtuples, so repr() is a complete and stable
+# description of everything on it. One small pickle per page; a file's mtime
+# is its last use, and the least recently used files go first once the cache
+# is over its size limit. Several processes (batch.py workers) can share it:
+# writes go through a per-process temp file and os.replace.
+DEFAULT_MAX_MB = 64
+MAX_MB_ENV = "PAPERIFY_PAGE_CACHE_MB" # 0 turns the cache off
+SUFFIX = ".page"
+# Export and the GUI preview keep separate caches, so pages drawn only for the
+# preview never count as "unchanged from the last export"
+EXPORT_CACHE = "page-cache"
+PREVIEW_CACHE = "preview-cache"
+
+
+def default_cache_dir(name=EXPORT_CACHE):
+    root = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "Paperify", name)
+
+
+def content_key(*parts):
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=20).hexdigest()
+
+
+def configured_max_bytes():
+    try: return int(float(os.environ.get(MAX_MB_ENV, DEFAULT_MAX_MB)) * 1024 * 1024)
+    except ValueError: return DEFAULT_MAX_MB * 1024 * 1024
+
+
+class PageCache:
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = configured_max_bytes() if max_bytes is None else max_bytes
+        self.hits = self.misses = self.writes = self.evicted = 0
+        self._size = None # bytes on disk, counted on first trim()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path) # mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # Truncated or from an older Python: drop it and render again
+            self.misses += 1
+            try: os.remove(path)
+            except OSError: pass
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        path = self._path(key)
+        part = f"{path}.{os.getpid()}.part"
+        try:
+            with open(part, 'wb') as f:
+                f.write(data)
+            os.replace(part, path)
+        except OSError:
+            return # full or read-only disk: the cache is only an optimisation
+        self.writes += 1
+        if self._size is not None: self._size += len(data)
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for e in it:
+                if not e.name.endswith(SUFFIX): continue
+                try: st = e.stat()
+                except OSError: continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+        return entries
+
+    def trim(self):
+        """Evicts least recently used pages until the cache fits max_bytes"""
+        if self._size is not None and self._size <= self.max_bytes: return
+        entries = self._entries()
+        self._size = sum(size for _, size, _ in entries)
+        if self._size <= self.max_bytes: return
+        for _, size, path in sorted(entries):
+            try: os.remove(path)
+            except OSError: continue
+            self._size -= size
+            self.evicted += 1
+            if self._size <= self.max_bytes: break
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try: os.remove(path)
+            except OSError: pass
+        self._size = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "evicted": self.evicted}
+
+    def disk_usage(self):
+        """(pages, bytes) currently on disk"""
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+
+if __name__ == "__main__":
+    # python pagecache.py stats | clear
+    if len(sys.argv) != 2 or sys.argv[1] not in ("stats", "clear"):
+        sys.exit("usage: python pagecache.py stats | clear")
+    for name in (EXPORT_CACHE, PREVIEW_CACHE):
+        cache = PageCache(default_cache_dir(name))
+        if sys.argv[1] == "clear":
+            cache.clear()
+        pages, size = cache.disk_usage()
+        print(f"{cache.directory}: {pages} pages, {size / 1024 / 1024:.1f} of {cache.max_bytes / 1024 / 1024:.1f} MB "
+              f"(set {MAX_MB_ENV} to change, 0 turns it off)")
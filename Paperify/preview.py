@@ -0,0 +1,212 @@
+import io
+from collections import OrderedDict
+
+from PySide6.QtWidgets import QScrollArea, QWidget, QVBoxLayout, QLabel
+from PySide6.QtCore import Qt, QCoreApplication, QObject, QThread, QTimer, QSize, QBuffer, QByteArray, QIODevice, Signal, Slot
+from PySide6.QtGui import QImage, QPainter, QPixmap
+
+# Edits are laid out once typing pauses for this long
+DEBOUNCE_MS = 300
+# Page images kept (grayscale, at the pane's width), least recently used dropped
+IMAGE_CACHE_PAGES = 64
+PAGE_ASPECT = 11.69 / 8.27 # A4, same as layout.PAGE_H / PAGE_W
+PAGE_GAP = 12
+
+# =============================================================================
+#    PREVIEW RENDERER (lives on its own QThread)
+# =============================================================================
+# lay_out() turns a snapshot of the paper into pages and reports one content
+# key per page; render_page() rasterizes a single page on request. A page is
+# drawn through the real reportlab renderer into a one-page PDF in memory and
+# rasterized by QtPdf, so the preview is exactly what export writes. Requests
+# for an older generation than `latest` are dropped unseen.
+class PreviewRenderer(QObject):
+    laid_out = Signal(int, list) # generation, page keys
+    page_ready = Signal(str, int, QImage) # page key, width, image
+    failed = Signal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.latest = 0 # set from the GUI thread
+        self.generation = 0
+        self.pages = []
+        self.cache = None # own PageCache and directory, so export's hits stay its own
+
+    def page_cache(self):
+        from pagecache import PREVIEW_CACHE, PageCache, configured_max_bytes, default_cache_dir
+        if self.cache is None and configured_max_bytes() > 0:
+            try: self.cache = PageCache(default_cache_dir(PREVIEW_CACHE))
+            except OSError: self.cache = False
+        return self.cache or None
+
+    @Slot(int, object, object, object)
+    def lay_out(self, generation, metadata, sections, urdu_font_path):
+        if generation != self.latest: return
+        from layout import layout_exam
+        from render_reportlab import page_key
+        try:
+            pages = layout_exam(metadata, sections, urdu_font_path)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.generation, self.pages = generation, pages
+        self.laid_out.emit(generation, [page_key(page) for page in pages])
+
+    @Slot(int, int, str, int)
+    def render_page(self, generation, index, key, width):
+        if generation != self.latest or generation != self.generation or index >= len(self.pages): return
+        from PySide6.QtPdf import QPdfDocument
+        from render_reportlab import render_pdf
+        try:
+            out = io.BytesIO()
+            render_pdf(out, [self.pages[index]], cache=self.page_cache())
+            buf = QBuffer()
+            buf.setData(QByteArray(out.getvalue()))
+            buf.open(QIODevice.ReadOnly)
+            doc = QPdfDocument()
+            doc.load(buf)
+            rendered = doc.render(0, QSize(width, round(width * PAGE_ASPECT)))
+            doc.close()
+            # QtPdf leaves the paper transparent
+            image = QImage(rendered.size(), QImage.Format_Grayscale8)
+            image.fill(Qt.white)
+            painter = QPainter(image)
+            painter.drawImage(0, 0, rendered)
+            painter.end()
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.page_ready.emit(key, width, image)
+
+
+# =============================================================================
+#    PREVIEW PANE (scrollable page list, renders what is on screen)
+# =============================================================================
+class PreviewPane(QScrollArea):
+    request_layout = Signal(int, object, object, object)
+    request_page = Signal(int, int, str, int)
+
+    def __init__(self, snapshot, parent=None):
+        """`snapshot()` returns (metadata, sections, urdu_font_path) for the
+        paper as it should be shown; it runs on the GUI thread."""
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.setWidgetResizable(True)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn) # the page width never jumps
+        self.setStyleSheet("QScrollArea { background-color: #7f8c8d; border: none; }")
+        inner = QWidget()
+        inner.setStyleSheet("background-color: #7f8c8d;")
+        self.page_layout = QVBoxLayout(inner)
+        self.page_layout.setSpacing(PAGE_GAP)
+        self.page_layout.setAlignment(Qt.AlignHCenter | Qt.AlignTop)
+        self.setWidget(inner)
+
+        self.generation = 0 # last layout asked for
+        self.shown = 0 # generation of the layout on screen
+        self.keys = [] # content key per page of the layout on screen
+        self.labels = []
+        self.images = OrderedDict() # (key, width) -> QImage
+        self.pending = set() # (key, width) asked for and not back yet
+
+        self.thread = QThread(self)
+        self.renderer = PreviewRenderer()
+        self.renderer.moveToThread(self.thread)
+        self.request_layout.connect(self.renderer.lay_out)
+        self.request_page.connect(self.renderer.render_page)
+        self.renderer.laid_out.connect(self.on_laid_out)
+        self.renderer.page_ready.connect(self.on_page_ready)
+        self.thread.start()
+        QCoreApplication.instance().aboutToQuit.connect(self.stop)
+
+        self.layout_timer = QTimer(self, singleShot=True, interval=DEBOUNCE_MS)
+        self.layout_timer.timeout.connect(self.lay_out)
+        self.visible_timer = QTimer(self, singleShot=True, interval=50)
+        self.visible_timer.timeout.connect(self.request_visible)
+        self.verticalScrollBar().valueChanged.connect(lambda _: self.visible_timer.start())
+        self.resize_timer = QTimer(self, singleShot=True, interval=150)
+        self.resize_timer.timeout.connect(self.show_pages)
+
+    def stop(self):
+        self.renderer.latest = -1 # anything still queued is dropped
+        self.thread.quit()
+        self.thread.wait()
+
+    def schedule(self, *_):
+        """Slot for any edit signal: restarts the debounce"""
+        self.layout_timer.start()
+
+    def lay_out(self):
+        self.generation += 1
+        self.renderer.latest = self.generation
+        self.request_layout.emit(self.generation, *self.snapshot())
+
+    def page_width(self):
+        return max(100, self.viewport().width() - 2 * PAGE_GAP)
+
+    def pixel_width(self):
+        return round(self.page_width() * self.devicePixelRatioF())
+
+    def on_laid_out(self, generation, keys):
+        if generation != self.generation: return
+        # Requests of older layouts were dropped by the renderer
+        self.shown, self.keys = generation, keys
+        self.pending.clear()
+        while len(self.labels) < len(keys):
+            label = QLabel()
+            label.setAlignment(Qt.AlignCenter)
+            label.setStyleSheet("background-color: white; color: #95a5a6;")
+            self.page_layout.addWidget(label)
+            self.labels.append(label)
+        while len(self.labels) > len(keys):
+            self.labels.pop().deleteLater()
+        self.show_pages()
+
+    def show_pages(self):
+        w = self.page_width()
+        size = QSize(w, round(w * PAGE_ASPECT))
+        px = self.pixel_width()
+        for i, (label, key) in enumerate(zip(self.labels, self.keys)):
+            label.setFixedSize(size)
+            image = self.images.get((key, px))
+            if image is not None: self.set_image(label, image)
+            elif label.pixmap().isNull(): label.setText(f"Page {i + 1}")
+            # else the old image stays up until the new one is ready
+        self.request_visible()
+
+    def set_image(self, label, image):
+        pixmap = QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(self.devicePixelRatioF())
+        label.setPixmap(pixmap)
+
+    def request_visible(self):
+        """Asks for the pages on screen (and one either side) that aren't cached"""
+        if self.shown != self.generation: return # a newer layout is on its way
+        top = self.verticalScrollBar().value()
+        bottom = top + self.viewport().height()
+        # Pages are fixed-size, so their positions follow from the index alone
+        # (label geometry lags behind until the layout has run)
+        h = round(self.page_width() * PAGE_ASPECT)
+        first = self.page_layout.contentsMargins().top()
+        px = self.pixel_width()
+        for i, key in enumerate(self.keys):
+            y = first + i * (h + PAGE_GAP)
+            if y + h < top - h or y > bottom + h: continue
+            if (key, px) in self.images:
+                self.images.move_to_end((key, px))
+            elif (key, px) not in self.pending:
+                self.pending.add((key, px))
+                self.request_page.emit(self.shown, i, key, px)
+
+    def on_page_ready(self, key, width, image):
+        self.pending.discard((key, width))
+        self.images[(key, width)] = image
+        while len(self.images) > IMAGE_CACHE_PAGES:
+            self.images.popitem(last=False)
+        if width != self.pixel_width(): return
+        for label, k in zip(self.labels, self.keys):
+            if k == key: self.set_image(label, image)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if event.size().width() != event.oldSize().width():
+            self.resize_timer.start() # re-rasterize at the new width once resizing settles
@@ -0,0 +1,156 @@
+import copy
+import json
+import os
+import sys
+from collections import UserList
+
+from examfile import read_exam_csv, write_exam_csv
+
+# =============================================================================
+#    PROJECT FILE (.paperify, versioned JSON lines)
+# =============================================================================
+# Line 1 is a header: format, version, metadata, and per section its fields
+# plus where its questions live in the body. Every following line is one
+# question, stored as the same dict the editor uses, so options and Match
+# Columns survive any character ("|" included). `start`/`end` are byte
+# offsets from the start of the body (the line after the header).
+FORMAT = "paperify"
+VERSION = 1
+EXTENSION = ".paperify"
+
+
+class ProjectFormatError(ValueError):
+    pass
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def write_project(fn, metadata, sections):
+    body, entries = [], []
+    offset = 0
+    for sec in sections:
+        lines = [(_dumps(q) + "\n").encode('utf-8') for q in sec['questions']]
+        size = sum(map(len, lines))
+        fields = {k: v for k, v in sec.items() if k != 'questions'}
+        entries.append({"section": fields, "count": len(lines), "start": offset, "end": offset + size})
+        body += lines
+        offset += size
+    header = {"format": FORMAT, "version": VERSION, "metadata": metadata, "sections": entries}
+
+    part = fn + ".part"
+    with open(part, 'wb') as f:
+        f.write((_dumps(header) + "\n").encode('utf-8'))
+        f.writelines(body)
+    os.replace(part, fn)
+
+
+class LazyQuestions(UserList):
+    """One section's questions, decoded from the file bytes on first access.
+    len() is known from the header, so the tree can show the section (and its
+    expand arrow) without decoding anything."""
+    def __init__(self, body, start, end, count):
+        self._body, self._span, self._count = body, (start, end), count
+        self._data = None
+        self._view = None # see snapshot()
+
+    @property
+    def data(self):
+        if self._data is None:
+            start, end = self._span
+            # One json.loads per section: raw newlines only ever separate lines
+            lines = bytes(self._body[start:end]).rstrip(b"\n")
+            self._data = json.loads(b"[" + lines.replace(b"\n", b",") + b"]")
+            self._body = None
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def __len__(self):
+        return self._count if self._data is None else len(self._data)
+
+    def snapshot(self):
+        """The questions for another thread to read: a plain copy once they are
+        decoded, else a second lazy list over the same bytes, which decodes
+        there and leaves this one (and the tree) untouched"""
+        if self._data is not None: return list(self._data)
+        if self._view is None: self._view = LazyQuestions(self._body, *self._span, self._count)
+        return self._view
+
+    # UserList builds slices, copies and sums as self.__class__(list), which
+    # this constructor doesn't take: hand those back as plain lists
+    def __getitem__(self, i):
+        return self.data[i]
+
+    def copy(self):
+        return list(self.data)
+
+    def __copy__(self):
+        return list(self.data)
+
+    def __add__(self, other):
+        return self.data + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self.data
+
+    def __mul__(self, n):
+        return self.data * n
+
+    __rmul__ = __mul__
+
+    def __deepcopy__(self, memo):
+        # Export works on a plain deep copy, the file bytes stay behind
+        return copy.deepcopy(self.data, memo)
+
+
+def read_project(fn):
+    """Returns (metadata, sections). Only the header is parsed here; each
+    section's questions decode when first used (see LazyQuestions).
+
+    The file is read with a single read() rather than mmap: a mapped file is
+    locked on Windows and saving back over it would fail."""
+    with open(fn, 'rb') as f:
+        raw = f.read()
+    nl = raw.find(b"\n")
+    try:
+        header = json.loads(raw[:nl if nl >= 0 else len(raw)])
+    except ValueError as e:
+        raise ProjectFormatError(f"not a Paperify project: {e}")
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise ProjectFormatError("not a Paperify project")
+    if header.get("version", 0) > VERSION:
+        raise ProjectFormatError(f"made by a newer Paperify (format version {header['version']})")
+
+    body = memoryview(raw)[nl + 1:]
+    sections = []
+    for entry in header["sections"]:
+        sec = dict(entry["section"])
+        sec['questions'] = LazyQuestions(body, entry["start"], entry["end"], entry["count"])
+        sections.append(sec)
+    return header["metadata"], sections
+
+
+# =============================================================================
+#    CONVERTER (progress CSV <-> project file)
+# =============================================================================
+def is_project(fn):
+    return fn.lower().endswith(EXTENSION)
+
+
+def convert(src, dst):
+    metadata, sections = read_project(src) if is_project(src) else read_exam_csv(src)
+    if is_project(dst): write_project(dst, metadata, sections)
+    else: write_exam_csv(dst, metadata, sections)
+    return sum(len(s['questions']) for s in sections)
+
+
+if __name__ == "__main__":
+    # python projectfile.py exam.csv exam.paperify (or the other way round)
+    if len(sys.argv) != 3:
+        sys.exit("usage: python projectfile.py <src.csv|src.paperify> <dst.paperify|dst.csv>")
+    count = convert(sys.argv[1], sys.argv[2])
+    print(f"{count} questions written to {sys.argv[2]}")
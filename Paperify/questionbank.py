@@ -0,0 +1,281 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from examfile import (
+    DEFAULT_METADATA, META_FIELDS, ReadReport, find_exam_csvs, iter_csv_rows, parse_rows, counted_rows,
+    meta_row, question_rows, write_csv_rows
+)
+
+# =============================================================================
+#    QUESTION BANK (every question from every paper, in one SQLite file)
+# =============================================================================
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id      INTEGER PRIMARY KEY,
+    type    TEXT NOT NULL,
+    text    TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '[]', -- JSON lists
+    col_a   TEXT NOT NULL DEFAULT '[]',
+    col_b   TEXT NOT NULL DEFAULT '[]',
+    section TEXT NOT NULL DEFAULT '',
+    class   TEXT NOT NULL DEFAULT '',
+    subject TEXT NOT NULL DEFAULT '',
+    test    TEXT NOT NULL DEFAULT '',
+    source  TEXT NOT NULL DEFAULT '',
+    added   REAL NOT NULL,
+    search  TEXT NOT NULL, -- folded text + options + columns + section, what the FTS index sees
+    answer  TEXT NOT NULL DEFAULT 'null', -- JSON, see examfile
+    notes   TEXT NOT NULL DEFAULT '',
+    school  TEXT NOT NULL DEFAULT '', -- rest of the paper's META row, '' = default
+    time    TEXT NOT NULL DEFAULT '',
+    marks   TEXT NOT NULL DEFAULT '',
+    UNIQUE (text, type, class, subject)
+);
+CREATE INDEX IF NOT EXISTS idx_questions_class ON questions (class, subject, type);
+CREATE INDEX IF NOT EXISTS idx_questions_subject ON questions (subject, type);
+CREATE INDEX IF NOT EXISTS idx_questions_type ON questions (type);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5 (
+    search, content='questions', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS questions_ai AFTER INSERT ON questions BEGIN
+    INSERT INTO questions_fts (rowid, search) VALUES (new.id, new.search);
+END;
+CREATE TRIGGER IF NOT EXISTS questions_ad AFTER DELETE ON questions BEGIN
+    INSERT INTO questions_fts (questions_fts, rowid, search) VALUES ('delete', old.id, old.search);
+END;
+CREATE TRIGGER IF NOT EXISTS questions_au AFTER UPDATE OF search ON questions BEGIN
+    INSERT INTO questions_fts (questions_fts, rowid, search) VALUES ('delete', old.id, old.search);
+    INSERT INTO questions_fts (rowid, search) VALUES (new.id, new.search);
+END;
+"""
+
+# Columns added after the first release, for banks created before them
+MIGRATIONS = [
+    ("answer", "ALTER TABLE questions ADD COLUMN answer TEXT NOT NULL DEFAULT 'null'"),
+    ("notes", "ALTER TABLE questions ADD COLUMN notes TEXT NOT NULL DEFAULT ''"),
+    ("school", "ALTER TABLE questions ADD COLUMN school TEXT NOT NULL DEFAULT ''"),
+    ("time", "ALTER TABLE questions ADD COLUMN time TEXT NOT NULL DEFAULT ''"),
+    ("marks", "ALTER TABLE questions ADD COLUMN marks TEXT NOT NULL DEFAULT ''"),
+]
+# Bumped whenever what goes into `search` changes; older banks are re-indexed
+# on open (1: section names)
+SEARCH_VERSION = 1
+
+SEARCH_LIMIT = 200
+IMPORT_CHUNK = 1000
+
+# --- URDU SEARCH FOLDING ---
+# unicode61 splits words on harakat (they aren't letters) and treats the
+# Arabic and Urdu forms of yeh/kaf/heh as different letters, while pasted
+# text mixes both. Index and query are folded the same way.
+URDU_FOLD = {
+    '\u064A': '\u06CC', '\u0649': '\u06CC', # Arabic yeh / alef maksura -> Farsi yeh
+    '\u0643': '\u06A9', # Arabic kaf -> keheh
+    '\u0647': '\u06C1', # heh -> heh goal
+}
+# Harakat, superscript alef and tatweel are dropped; one regex pass does both
+FOLD_RE = re.compile('[\u064B-\u065F\u0670\u0640' + ''.join(URDU_FOLD) + ']')
+TERM_RE = re.compile(r'\w+')
+
+
+def fold(text):
+    if not text.isascii():
+        text = FOLD_RE.sub(lambda m: URDU_FOLD.get(m.group(), ''), text)
+    return text.casefold()
+
+
+def default_bank_path():
+    root = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(root, "Paperify", "questions.db")
+
+
+def _search(q, section):
+    return fold(" ".join([q['text'], *q.get('options', []), *q.get('col_a', []), *q.get('col_b', []), section]))
+
+
+def _row(q, section, metadata, source):
+    options, col_a, col_b = q.get('options', []), q.get('col_a', []), q.get('col_b', [])
+    return (q['type'], q['text'], json.dumps(options, ensure_ascii=False),
+            json.dumps(col_a, ensure_ascii=False), json.dumps(col_b, ensure_ascii=False),
+            section, metadata.get('class', ''), metadata.get('subject', ''), metadata.get('test', ''),
+            source, time.time(), _search(q, section), json.dumps(q.get('answer')), q.get('notes', ''),
+            metadata.get('school', ''), metadata.get('time', ''), metadata.get('marks', ''))
+
+
+def _metadata(row):
+    """The paper's META fields as stored, defaults for the ones left blank"""
+    return dict(DEFAULT_METADATA, **{key: row[key] for key in META_FIELDS if row[key]})
+
+
+def _question(row):
+    """DB row -> question dict in the same shape the editor/CSV use"""
+    q = {"type": row['type'], "text": row['text']}
+    if q['type'] == "MCQ": q['options'] = json.loads(row['options'])
+    elif q['type'] == "Match Columns":
+        q['col_a'] = json.loads(row['col_a'])
+        q['col_b'] = json.loads(row['col_b'])
+    answer = json.loads(row['answer'])
+    if answer is not None: q['answer'] = answer
+    if row['notes']: q['notes'] = row['notes']
+    return q
+
+
+class QuestionBank:
+    def __init__(self, path=None):
+        self.path = path or default_bank_path()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        columns = {r['name'] for r in self.db.execute("PRAGMA table_info(questions)")}
+        for column, sql in MIGRATIONS:
+            if column not in columns: self.db.execute(sql)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < SEARCH_VERSION: self.reindex()
+
+    def reindex(self):
+        """Recomputes every row's search text (the FTS triggers follow)"""
+        with self.db:
+            rows = self.db.execute("SELECT * FROM questions").fetchall()
+            self.db.executemany("UPDATE questions SET search = ? WHERE id = ?",
+                                [(_search(_question(r), r['section']), r['id']) for r in rows])
+            self.db.execute(f"PRAGMA user_version = {SEARCH_VERSION}")
+
+    def close(self):
+        self.db.close()
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+    def _insert(self, rows):
+        return self.db.executemany("""
+            INSERT OR IGNORE INTO questions
+                (type, text, options, col_a, col_b, section, class, subject, test, source, added, search,
+                 answer, notes, school, time, marks)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows).rowcount
+
+    def add_paper(self, metadata, sections, source=""):
+        """Adds every question of a paper, returns how many were new"""
+        with self.db:
+            return self._insert([_row(q, sec['name'], metadata, source)
+                                 for sec in sections for q in sec['questions']])
+
+    def import_csv(self, fn, report=None):
+        """Streams one progress CSV or bank dump into the bank, IMPORT_CHUNK
+        rows per executemany. Returns how many questions were new."""
+        report = report or ReadReport()
+        t0 = time.perf_counter()
+        metadata, section, source = dict(DEFAULT_METADATA), "", os.path.basename(fn)
+        added, chunk = 0, []
+        with self.db:
+            for kind, rec in parse_rows(counted_rows(iter_csv_rows(fn), report), report.errors):
+                if kind == "meta": metadata = dict(DEFAULT_METADATA, **rec)
+                elif kind == "section": section = rec['name']
+                else:
+                    chunk.append(_row(rec, section, metadata, source))
+                    if len(chunk) >= IMPORT_CHUNK:
+                        added += self._insert(chunk)
+                        chunk = []
+            added += self._insert(chunk)
+        report.bytes = os.path.getsize(fn)
+        report.seconds = time.perf_counter() - t0
+        return added
+
+    def import_csvs(self, paths):
+        """Bulk import of CSVs (files or folders). Returns (added, errors) where
+        errors are (file, message), file-level failures and skipped rows alike"""
+        added, errors = 0, []
+        for fn in find_exam_csvs(paths):
+            report = ReadReport()
+            try:
+                added += self.import_csv(fn, report)
+            except Exception as e:
+                errors.append((fn, str(e)))
+            errors += [(fn, f"line {err.line}: {err.message}") for err in report.errors]
+        return added, errors
+
+    def dump_csv(self, fn):
+        """Writes the whole bank as one CSV (a META row per paper, a SEC row per
+        section), streamed straight from the cursor. Returns the question count."""
+        cur = self.db.execute("SELECT * FROM questions ORDER BY class, subject, test, school, time, marks, section, id")
+        count = 0
+
+        def rows():
+            nonlocal count
+            paper = section = None
+            for r in cur:
+                if tuple(r[key] for key in META_FIELDS) != paper:
+                    paper, section = tuple(r[key] for key in META_FIELDS), None
+                    yield meta_row(_metadata(r))
+                if r['section'] != section:
+                    section = r['section']
+                    yield ["SEC", section, "", 1, 1]
+                count += 1
+                yield from question_rows(_question(r))
+
+        write_csv_rows(fn, rows())
+        return count
+
+    def delete(self, qid):
+        with self.db:
+            self.db.execute("DELETE FROM questions WHERE id = ?", (qid,))
+
+    def distinct(self, column):
+        """Values for the class/subject/type filters"""
+        assert column in ("class", "subject", "type")
+        return [r[0] for r in self.db.execute(f"SELECT DISTINCT {column} FROM questions WHERE {column} != '' ORDER BY 1")]
+
+    def search(self, text="", q_class="", subject="", q_type="", limit=SEARCH_LIMIT):
+        """Returns [(id, question dict, row)] best match first. Every word must
+        match, the last one as a prefix so results follow the typing."""
+        where, args = [], []
+        for col, val in (("q.class", q_class), ("q.subject", subject), ("q.type", q_type)):
+            if val:
+                where.append(f"{col} = ?")
+                args.append(val)
+
+        terms = TERM_RE.findall(fold(text))
+        if terms:
+            match = " ".join(f'"{t}"' for t in terms) + "*"
+            sql = ("SELECT q.* FROM questions_fts f JOIN questions q ON q.id = f.rowid "
+                   "WHERE questions_fts MATCH ?" + "".join(" AND " + w for w in where) +
+                   " ORDER BY f.rank LIMIT ?")
+            args = [match] + args
+        else:
+            sql = ("SELECT q.* FROM questions q" + (" WHERE " + " AND ".join(where) if where else "") +
+                   " ORDER BY q.id DESC LIMIT ?")
+        rows = self.db.execute(sql, args + [limit]).fetchall()
+        return [(r['id'], _question(r), r) for r in rows]
+
+
+if __name__ == "__main__":
+    # python questionbank.py import <csv files/folders> | dump <csv> | search <words>
+    if len(sys.argv) < 3 or sys.argv[1] not in ("import", "dump", "search"):
+        sys.exit("usage: python questionbank.py import <csv/folder>... | dump <csv> | search <words>")
+    bank = QuestionBank()
+    if sys.argv[1] == "import":
+        for fn in find_exam_csvs(sys.argv[2:]):
+            report = ReadReport()
+            try:
+                added = bank.import_csv(fn, report)
+            except Exception as e:
+                print(f"FAIL  {fn}: {e}")
+                continue
+            print(f"OK    {fn}: {added} new, {report.summary()}")
+            for err in report.errors: print(f"      line {err.line}: {err.message}")
+        print(f"{bank.count()} questions in {bank.path}")
+    elif sys.argv[1] == "dump":
+        t0 = time.perf_counter()
+        count = bank.dump_csv(sys.argv[2])
+        print(f"{count} questions written to {sys.argv[2]} in {time.perf_counter() - t0:.2f} s")
+    else:
+        t0 = time.perf_counter()
+        hits = bank.search(" ".join(sys.argv[2:]))
+        for qid, q, row in hits: print(f"{qid:6}  [{row['class']} {row['subject']}] {q['text'][:70]}")
+        print(f"{len(hits)} results in {(time.perf_counter() - t0) * 1000:.1f} ms")
@@ -0,0 +1,63 @@
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.patches import FancyBboxPatch
+
+from layout import PAGE_W, PAGE_H, Text, Box, Rule
+from metrics import PT, font_properties, mpl_text, text_extent, text_width
+from tracing import span
+
+# =============================================================================
+#    MATPLOTLIB RENDERER (one Figure per page, saved through PdfPages)
+# =============================================================================
+# Figures are created without pyplot, so this also runs off the GUI thread
+def new_page():
+    fig = Figure(figsize=(PAGE_W, PAGE_H))
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_xlim(0, PAGE_W); ax.set_ylim(0, PAGE_H); ax.axis('off')
+    return fig, ax
+
+
+def draw_item(ax, item):
+    if isinstance(item, Text) and item.runs:
+        # Mixed scripts: each run in its own face, placed left to right
+        widths = [text_width(run, font, item.fs, item.weight) / PT for run, font in item.runs]
+        x = item.x - {'center': sum(widths) / 2, 'right': sum(widths)}.get(item.ha, 0)
+        y, va = item.y, item.va
+        if va == 'top':
+            # One baseline for all runs, where va='top' puts the whole line's
+            _, h, d = text_extent(item.text, item.font, item.fs, item.weight)
+            _, lp_h, lp_d = text_extent("lp", item.font, item.fs, item.weight)
+            y, va = y - max(h - d, lp_h - lp_d) / PT, 'baseline'
+        for (run, font), w in zip(item.runs, widths):
+            draw_item(ax, item._replace(x=x, y=y, text=run, ha='left', va=va, font=font, runs=None))
+            x += w
+    elif isinstance(item, Text):
+        kwargs = {'fontsize': item.fs, 'fontweight': item.weight, 'ha': item.ha, 'va': item.va}
+        if item.font: kwargs['fontproperties'] = font_properties(item.font, item.fs)
+        ax.text(item.x, item.y, mpl_text(item.text, item.font), **kwargs)
+    elif isinstance(item, Box):
+        ax.add_patch(FancyBboxPatch((item.x, item.y), item.w, item.h,
+                                    boxstyle=f"round,pad={item.pad}", ec="black", fc=item.fc, lw=item.lw))
+    elif isinstance(item, Rule):
+        ax.plot([item.x0, item.x1], [item.y0, item.y1], color='black', lw=item.lw)
+
+
+def render_pdf(fn, pages, progress=None, cache=None, report=None, pool=None):
+    # `cache` and `pool` are unused: a Figure can't be reused across PdfPages
+    # documents, nor drawn in another process.
+    # matplotlib subsets fonts itself, so `report` gets no font sizes.
+    # PdfPages writes each page out as it is saved; `pages` may be a generator.
+    total = len(pages) if hasattr(pages, "__len__") else 0
+    i = -1
+    with PdfPages(fn) as pdf:
+        for i, page in enumerate(pages):
+            with span("page", "render", number=i + 1):
+                fig, ax = new_page()
+                with span("draw", "render"):
+                    for item in page:
+                        draw_item(ax, item)
+                with span("savefig", "render"):
+                    pdf.savefig(fig)
+                fig.clear() # the Figure is cyclic garbage, empty it now
+            if progress: progress(f"Rendering page {i + 1}", i + 1, total)
+    return i + 1
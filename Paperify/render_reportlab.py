@@ -0,0 +1,381 @@
+import io
+import os
+import re
+import threading
+import zlib
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+
+import matplotlib
+import reportlab
+from reportlab import rl_config
+from reportlab.pdfgen import canvas as rl_canvas
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+from matplotlib import colors as mcolors
+from matplotlib import font_manager as fm
+
+from layout import PAGE_W, PAGE_H, Text, Box, Rule
+from mathcache import formula
+from metrics import PT, font_properties, is_math, text_extent, text_width
+from pagecache import content_key
+import tracing
+from tracing import span, traced
+
+# Plain Flate streams, ASCII85 only makes them bigger and slower to write
+rl_config.useA85 = 0
+
+MATH_RE = re.compile(r'(\$[^$]+\$)')
+
+_rl_fonts = {}
+
+# TrueType instructions only matter when rasterizing small sizes on screen;
+# PDF viewers and printers don't need them, and neither do they need the
+# name table beyond the family/style names
+HINTING_TABLES = ('cvt ', 'fpgm', 'prep')
+KEEP_NAME_IDS = (1, 2)
+
+# reportlab's TTFontFile reads through a shared file position, and the
+# preview renders on its own thread while exporting
+_subset_lock = threading.Lock()
+_embedding = threading.local() # .report of the document being saved on this thread
+
+# =============================================================================
+#    REPORTLAB RENDERER (draws the page model straight to PDF operators)
+# =============================================================================
+def rl_font(path):
+    """Registers a TTF with reportlab once per process, returns its name"""
+    name = _rl_fonts.get(path)
+    if name is None:
+        name = "PF-" + os.path.splitext(os.path.basename(path))[0]
+        font = TTFont(name, path)
+        make_subset = font.face.makeSubset
+        font.face.makeSubset = lambda subset: embed_subset(make_subset, subset, name[3:])
+        pdfmetrics.registerFont(font)
+        _rl_fonts[path] = name
+    return name
+
+
+def embed_subset(make_subset, subset, font_name):
+    """reportlab already embeds one subset per font per document (split in
+    256-glyph chunks), shared by all pages; this slims each chunk and counts it"""
+    with _subset_lock:
+        data = make_subset(subset)
+    data = slim_subset(data)
+    report = getattr(_embedding, "report", None)
+    if report is not None: report.add_font(font_name, len(zlib.compress(data)))
+    return data
+
+
+@lru_cache(maxsize=64)
+@traced("slim_subset")
+def slim_subset(data):
+    """Strips hinting and all but the basic names from a TrueType subset.
+    Cached: re-exporting the same paper produces the same subsets."""
+    from fontTools.ttLib import TTFont as FontFile
+    font = FontFile(io.BytesIO(data), recalcTimestamp=False) # same paper, same bytes
+    glyf = font['glyf']
+    for glyph_name in glyf.keys():
+        glyf[glyph_name].removeHinting()
+    for tag in HINTING_TABLES:
+        if tag in font: del font[tag]
+    maxp = font['maxp']
+    maxp.maxSizeOfInstructions = maxp.maxFunctionDefs = maxp.maxInstructionDefs = 0
+    maxp.maxStorage = maxp.maxStackElements = maxp.maxTwilightPoints = 0
+    font['name'].names = [n for n in font['name'].names if n.nameID in KEEP_NAME_IDS]
+    out = io.BytesIO()
+    font.save(out)
+    return out.getvalue()
+
+
+def split_math(text):
+    """Returns [(segment, is_math)] for drawing plain and $...$ parts separately"""
+    if not is_math(text):
+        return [(text, False)]
+    return [(seg, seg.startswith('$')) for seg in MATH_RE.split(text) if seg]
+
+
+def segment_width(seg, math, font, path, item):
+    if math: return text_width(seg, font, item.fs, item.weight)
+    return pdfmetrics.stringWidth(seg, rl_font(path), item.fs)
+
+
+def top_offset(item):
+    # matplotlib's va='top' puts the top of the line box (at least "lp" tall) at y
+    _, h, d = text_extent(item.text, item.font, item.fs, item.weight)
+    _, lp_h, lp_d = text_extent("lp", item.font, item.fs, item.weight)
+    return max(h - d, lp_h - lp_d)
+
+
+def define_forms(c, forms, typeset=None):
+    """Writes the formula forms referenced by the pages (call after the last
+    page). `typeset` holds formulas already typeset on render workers."""
+    for key, name in forms.items():
+        f = (typeset or {}).get(key) or formula(*key)
+        x0, y0, x1, y1 = f.bbox
+        c.beginForm(name, x0 - 1, y0 - 1, x1 + 1, y1 + 1)
+        c.setFillColorRGB(0, 0, 0)
+        p = c.beginPath()
+        for op, *args in f.ops:
+            if op == 'm': p.moveTo(*args)
+            elif op == 'l': p.lineTo(*args)
+            elif op == 'c': p.curveTo(*args)
+            else: p.close()
+        c.drawPath(p, stroke=0, fill=1, fillMode=1)
+        c.endForm()
+
+
+# =============================================================================
+#    PAGE OPS (a page resolved to points, fonts and widths; no canvas needed)
+# =============================================================================
+# ("text", font path, size, x, y, string)
+# ("math", formula key, x, y)
+# ("box", x, y, w, h, radius, line width, fill rgb)
+# ("rule", x0, y0, x1, y1, line width)
+# Everything that measures text happens here, so these are what the page
+# cache stores. Bump OPS_VERSION when the ops or their meaning change.
+OPS_VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def font_stamp(path):
+    st = os.stat(path)
+    return path, st.st_size, st.st_mtime_ns
+
+
+def face_path(font, fs, weight='normal'):
+    # Plain str, so the ops pickle
+    return font or str(fm.findfont(font_properties(font, fs, weight)))
+
+
+def page_fonts(page):
+    """Every font file the page's text is drawn from, default faces included"""
+    fonts = set()
+    for item in page:
+        if isinstance(item, Text):
+            fonts.update(face_path(font, item.fs, item.weight) for _, font in item.runs or ((item.text, item.font),))
+    return sorted(fonts)
+
+
+def page_key(page):
+    """Content hash of a page plus everything else its ops depend on: the
+    reportlab/matplotlib versions and every font file its ops name. The ops
+    hold absolute font paths, so a moved font (a onefile build unpacks to a
+    new temp directory on every launch) is a different key, not a stale hit."""
+    stamps = [font_stamp(f) for f in page_fonts(page)]
+    return content_key(OPS_VERSION, reportlab.Version, matplotlib.__version__, stamps, page)
+
+
+def font_path(item):
+    return face_path(item.font, item.fs, item.weight)
+
+
+def text_ops(item, ops):
+    if not item.text: return
+    segments = [] # (string, is math, font, font path), left to right
+    for run, font in item.runs or ((item.text, item.font),):
+        path = face_path(font, item.fs, item.weight)
+        segments += [(seg, math, font, path) for seg, math in split_math(run)]
+    widths = [segment_width(seg, math, font, path, item) for seg, math, font, path in segments]
+    total = sum(widths)
+
+    x = item.x * PT
+    if item.ha == 'center': x -= total / 2
+    elif item.ha == 'right': x -= total
+    y = item.y * PT
+    if item.va == 'top':
+        y -= top_offset(item)
+
+    for (seg, math, font, path), w in zip(segments, widths):
+        if math: ops.append(("math", (seg, font, item.fs, item.weight), x, y))
+        else: ops.append(("text", path, item.fs, x, y, seg))
+        x += w
+
+
+@traced("page_ops")
+def page_ops(page):
+    ops = []
+    for item in page:
+        if isinstance(item, Text):
+            text_ops(item, ops)
+        elif isinstance(item, Box):
+            # Same geometry as matplotlib's "round,pad=..." FancyBboxPatch
+            ops.append(("box", (item.x - item.pad) * PT, (item.y - item.pad) * PT,
+                        (item.w + 2 * item.pad) * PT, (item.h + 2 * item.pad) * PT,
+                        item.pad * PT, item.lw, mcolors.to_rgb(item.fc)))
+        elif isinstance(item, Rule):
+            ops.append(("rule", item.x0 * PT, item.y0 * PT, item.x1 * PT, item.y1 * PT, item.lw))
+    return ops
+
+
+@traced("draw_ops")
+def draw_ops(c, ops, forms):
+    """Emits one page's ops. Runs of text share a single BT/ET text object."""
+    text, font = None, None
+    for op in ops:
+        kind = op[0]
+        if kind == "text":
+            _, path, fs, x, y, s = op
+            if text is None:
+                c.setFillColorRGB(0, 0, 0)
+                text, font = c.beginText(), None
+            if (path, fs) != font:
+                text.setFont(rl_font(path), fs)
+                font = (path, fs)
+            text.setTextOrigin(x, y)
+            text.textOut(s)
+            continue
+        if text is not None:
+            c.drawText(text)
+            text = None
+
+        if kind == "math":
+            # Every distinct formula becomes one form XObject, each occurrence is a Do
+            _, key, x, y = op
+            name = forms.get(key)
+            if name is None:
+                name = forms[key] = f"Math{len(forms)}"
+            c.saveState()
+            c.translate(x, y)
+            c.doForm(name)
+            c.restoreState()
+        elif kind == "box":
+            _, x, y, w, h, r, lw, rgb = op
+            c.setLineWidth(lw)
+            c.setStrokeColorRGB(0, 0, 0)
+            c.setFillColorRGB(*rgb)
+            c.roundRect(x, y, w, h, r, stroke=1, fill=1)
+        elif kind == "rule":
+            _, x0, y0, x1, y1, lw = op
+            c.setLineWidth(lw)
+            c.setStrokeColorRGB(0, 0, 0)
+            c.line(x0, y0, x1, y1)
+    if text is not None: c.drawText(text)
+
+
+def compress_last_page(c):
+    """Deflates the page just finished right away. reportlab keeps every page's
+    content as text until save() and compresses it only then; this keeps only
+    the (same) compressed bytes, a fraction of the size."""
+    page = c._doc.Pages.pages[-1]
+    if not page.compression or page.Contents or not page.stream: return
+    stream = pdfdoc.PDFStream(content=zlib.compress(page.stream.encode('utf-8')))
+    stream.dictionary["Filter"] = pdfdoc.PDFArray([pdfdoc.PDFName("FlateDecode")])
+    stream.__Comment__ = "page stream"
+    page.Contents, page.stream = stream, None
+
+
+# =============================================================================
+#    PARALLEL OPS (page ranges measured on a process pool, drawn here in order)
+# =============================================================================
+# Only measuring is farmed out. reportlab numbers a font's subset glyphs in
+# the order the document first uses them, so a single canvas draws every
+# page, in order, in this process. Worker results are plain data keyed by
+# font path and formula key, which keeps each font and each formula form
+# once per document however many workers measured its pages.
+PAGES_PER_TASK = 4
+TASKS_AHEAD = 2 * (os.cpu_count() or 1)
+
+
+def ops_task(pages):
+    """Runs on a pool worker: the pages' ops, the formulas they use typeset
+    and what tracing recorded"""
+    ops = [page_ops(page) for page in pages]
+    typeset = {op[1]: formula(*op[1]) for page in ops for op in page if op[0] == "math"}
+    return ops, typeset, tracing.take()
+
+
+def cached_page_ops(page, cache):
+    """(ops, whether they came from `cache`)"""
+    if cache is None: return page_ops(page), False
+    key = page_key(page)
+    ops = cache.get(key)
+    if ops is not None: return ops, True
+    ops = page_ops(page)
+    cache.put(key, ops)
+    return ops, False
+
+
+def submit_ops(chunk, cache, pool):
+    keys = [page_key(page) for page in chunk] if cache is not None else [None] * len(chunk)
+    hits = [cache.get(key) for key in keys] if cache is not None else [None] * len(chunk)
+    misses = [page for page, hit in zip(chunk, hits) if hit is None]
+    return keys, hits, pool.submit(ops_task, misses) if misses else None
+
+
+def collect_ops(task, cache, typeset):
+    keys, hits, future = task
+    fresh = iter(())
+    if future is not None:
+        ops, formulas, recorded = future.result()
+        tracing.merge(recorded)
+        typeset.update(formulas)
+        fresh = iter(ops)
+    for key, hit in zip(keys, hits):
+        if hit is not None:
+            yield hit, True
+            continue
+        ops = next(fresh)
+        if cache is not None: cache.put(key, ops)
+        yield ops, False
+
+
+def iter_page_ops(pages, cache=None, pool=None, typeset=None):
+    """Yields (ops, from cache) for every page, in order. Without a `pool`
+    (a concurrent.futures executor) pages are measured here as they come;
+    with one, up to TASKS_AHEAD ranges of PAGES_PER_TASK pages are measured
+    on its workers while earlier pages are drawn. Formulas typeset there are
+    added to `typeset` for define_forms."""
+    if pool is None:
+        for page in pages:
+            yield cached_page_ops(page, cache)
+        return
+    pages = iter(pages)
+    window = deque()
+    try:
+        while True:
+            chunk = list(islice(pages, PAGES_PER_TASK))
+            if chunk: window.append(submit_ops(chunk, cache, pool))
+            if not window: return
+            if chunk and len(window) < TASKS_AHEAD: continue
+            yield from collect_ops(window.popleft(), cache, typeset)
+    finally:
+        for _, _, future in window: # cancelled or failed: drop what hasn't started
+            if future is not None: future.cancel()
+
+
+def render_pdf(fn, pages, progress=None, cache=None, report=None, pool=None):
+    """`pages` may be any iterable, a stream_exam() generator included; pages
+    are drawn and released one at a time. `cache` is a PageCache: pages whose
+    content was rendered before reuse their ops instead of being measured
+    again. With a `pool` (process pool executor) pages are measured on its
+    workers, see iter_page_ops. `report` (an ExportReport) gets the cached
+    page count and the embedded font bytes. Progress totals are 0 when
+    `pages` has no length. Returns the page count."""
+    c = rl_canvas.Canvas(fn, pagesize=(PAGE_W * PT, PAGE_H * PT))
+    total = len(pages) if hasattr(pages, "__len__") else 0
+    forms, typeset = {}, {}
+    i = -1
+    for i, (ops, cached) in enumerate(iter_page_ops(pages, cache, pool, typeset)):
+        with span("page", "render", number=i + 1, cached=cached):
+            draw_ops(c, ops, forms)
+            c.showPage()
+            compress_last_page(c)
+        if cached and report is not None: report.cached_pages += 1
+        if progress: progress(f"Rendering page {i + 1}", i + 1, total)
+    define_forms(c, forms, typeset)
+    save(c, report)
+    if cache is not None: cache.trim()
+    return i + 1
+
+
+def save(c, report=None):
+    """Writes the document; `report` gets the embedded font bytes"""
+    _embedding.report = report # fonts are subset and embedded while saving
+    try:
+        with span("save", "render", pages=c.getPageNumber() - 1):
+            c.save()
+    finally:
+        _embedding.report = None
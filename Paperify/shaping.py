@@ -0,0 +1,94 @@
+import re
+from functools import lru_cache
+
+from tracing import traced
+
+# --- URDU TEXT HANDLERS ---
+try:
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+    HAS_URDU_LIB = True
+except ImportError:
+    HAS_URDU_LIB = False
+    print("Warning: 'arabic-reshaper' or 'python-bidi' not installed.")
+
+# Distinct lines in a large paper easily run into the thousands
+SHAPING_CACHE_SIZE = 16384
+
+URDU_RE = re.compile('[\u0600-\u06FF]')
+# Reshaped Urdu comes back as Arabic presentation forms
+URDU_GLYPH_RE = re.compile('[\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF]')
+# The first letter of either script sets the line's direction
+STRONG_RE = re.compile('[A-Za-z\u00C0-\u024F\u0600-\u06FF]')
+MATH_SPAN_RE = re.compile(r'\$[^$]+\$')
+# While reordering, each $...$ span stands in as one private use character:
+# a strong left-to-right letter, so the formula is never turned around
+PLACEHOLDER = 0xE000
+
+# =============================================================================
+#    TEXT SHAPING (script runs: Urdu reshaping + bidi reordering, memoized)
+# =============================================================================
+def is_urdu_text(text):
+    return bool(HAS_URDU_LIB and text and URDU_RE.search(text))
+
+
+@lru_cache(maxsize=None)
+def _reshaper(font):
+    # A font-specific config only emits ligatures the TTF actually has glyphs for
+    if font:
+        try:
+            return arabic_reshaper.ArabicReshaper(arabic_reshaper.config_for_true_type_font(font))
+        except Exception:
+            pass # fontTools missing or unreadable font, fall back to the defaults
+    return arabic_reshaper.default_reshaper
+
+
+@lru_cache(maxsize=SHAPING_CACHE_SIZE)
+@traced("script_runs")
+def script_runs(text, font=None):
+    """The line as drawn left to right: a tuple of (segment, font) runs. Urdu
+    is reshaped and drawn with `font`; English, digits and $...$ math (kept
+    whole, in its own order) with None, the default face. Spaces and
+    punctuation go with the run before them."""
+    if not is_urdu_text(text): return ((text, None),)
+    maths = MATH_SPAN_RE.findall(text)
+    spans = iter(range(len(maths)))
+    plain = MATH_SPAN_RE.sub(lambda m: chr(PLACEHOLDER + next(spans)), text)
+    first = STRONG_RE.search(MATH_SPAN_RE.sub("", text))
+    base = 'R' if first and URDU_RE.match(first.group()) else 'L'
+    visual = get_display(_reshaper(font).reshape(plain), base_dir=base)
+
+    runs, lead = [], ""
+    for ch in visual:
+        if PLACEHOLDER <= ord(ch) < PLACEHOLDER + len(maths): seg, f = maths[ord(ch) - PLACEHOLDER], None
+        elif URDU_GLYPH_RE.match(ch): seg, f = ch, font
+        elif ch.isalnum(): seg, f = ch, None
+        elif runs:
+            runs[-1][0] += ch
+            continue
+        else:
+            lead += ch # neutral start of the line, goes with the first run
+            continue
+        if runs and runs[-1][1] == f: runs[-1][0] += seg
+        else: runs.append([lead + seg, f])
+        lead = ""
+    if lead: runs.append([lead, font])
+    return tuple((seg, f) for seg, f in runs)
+
+
+@lru_cache(maxsize=SHAPING_CACHE_SIZE)
+@traced("process_text")
+def process_text(text, font=None):
+    """Returns (display_text, is_urdu) ready to be drawn left to right; see
+    script_runs for the fonts of its parts"""
+    if is_urdu_text(text):
+        return "".join(seg for seg, _ in script_runs(text, font)), True
+    return text, False
+
+
+def shaping_cache_info():
+    return process_text.cache_info()
+
+
+def runs_cache_info():
+    return script_runs.cache_info()
@@ -0,0 +1,328 @@
+import argparse
+import csv
+import io
+import os
+import re
+import time
+
+from reportlab.graphics.barcode import qrencoder
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+from reportlab.pdfgen import canvas as rl_canvas
+
+from layout import PAGE_W, PAGE_H, Text, Rule
+from mathcache import formula
+from metrics import PT, mpl_text, text_width
+from render_reportlab import (
+    compress_last_page, define_forms, draw_ops, font_path, iter_page_ops, rl_font, save
+)
+from shaping import process_text, script_runs
+from tracing import span
+
+# Student list columns (header row, any case); the QR code holds the `qr`
+# column when there is one, else the roll number
+NAME_COLUMNS = ("name", "student", "student name")
+ROLL_COLUMNS = ("roll", "roll no", "roll no.", "roll number", "roll_no", "rollno")
+QR_COLUMNS = ("qr", "code")
+
+# Stamped text sits this far above the blank line's baseline, in the standard
+# Helvetica (nothing to embed) when it fits WinAnsi, else as outlines
+LIFT = 2 # points
+STAMP_FONT = "Helvetica"
+QR_SIZE = 0.7 # inches, top right of the header under the rule
+QR_MASK = 0 # fixed: picking the best of 8 masks costs 8x, any mask scans
+SLOT_MARKER = "%PaperifyStamp\n"
+SAFE_NAME_RE = re.compile(r'[^\w\-]+')
+
+# =============================================================================
+#    STUDENT LIST
+# =============================================================================
+def _column(header, names):
+    for i, h in enumerate(header):
+        if h.strip().lower() in names: return i
+    return None
+
+
+def read_students(fn):
+    """Returns [{"name", "roll", "qr"}] from a CSV with a header row naming
+    at least a name or a roll number column"""
+    with open(fn, 'r', newline='', encoding='utf-8-sig') as f:
+        rows = [row for row in csv.reader(f) if any(cell.strip() for cell in row)]
+    if not rows: raise ValueError(f"{os.path.basename(fn)} is empty")
+    header = rows[0]
+    name, roll, qr = (_column(header, names) for names in (NAME_COLUMNS, ROLL_COLUMNS, QR_COLUMNS))
+    if name is None and roll is None:
+        raise ValueError(f"{os.path.basename(fn)} needs a header row with a Name or Roll No column")
+
+    def cell(row, i): return row[i].strip() if i is not None and i < len(row) else ""
+    students = []
+    for row in rows[1:]:
+        s = {"name": cell(row, name), "roll": cell(row, roll)}
+        s["qr"] = cell(row, qr) or s["roll"] or s["name"]
+        students.append(s)
+    return students
+
+
+# =============================================================================
+#    OVERLAY (name, roll number and QR code as raw PDF operators)
+# =============================================================================
+# The overlay doesn't touch reportlab's font subsets, so the same paper can be
+# stamped into one shared document or byte-patched into copies of one file.
+def student_fields(page):
+    """Where the first page's "Name: ___" and "Roll No: ___" blanks start and
+    how wide they are, plus the QR code's top right corner: a dict of
+    (x, y, width, size) and (x, y) tuples in points"""
+    fields = {}
+    for item in page:
+        if isinstance(item, Text) and item.ha == 'left':
+            for key, label in (("name", "Name:"), ("roll", "Roll No:")):
+                if item.text.startswith(label) and "_" in item.text and key not in fields:
+                    blank = item.text.index("_")
+                    font = rl_font(font_path(item))
+                    x = item.x * PT + pdfmetrics.stringWidth(item.text[:blank], font, item.fs)
+                    fields[key] = (x, item.y * PT, pdfmetrics.stringWidth(item.text[blank:], font, item.fs), item.fs)
+        elif isinstance(item, Rule) and "qr" not in fields:
+            fields["qr"] = (item.x1 * PT, (item.y0 - 0.1) * PT)
+    if "name" not in fields or "roll" not in fields:
+        raise ValueError("The paper's header has no Name / Roll No lines to stamp")
+    fields.setdefault("qr", ((PAGE_W - 0.7) * PT, (PAGE_H - 1.4) * PT))
+    return fields
+
+
+def pdf_string(text):
+    out = []
+    for b in text.encode('cp1252'):
+        if chr(b) in '()\\': out.append('\\' + chr(b))
+        elif 32 <= b < 127: out.append(chr(b))
+        else: out.append(f'\\{b:03o}')
+    return '(' + ''.join(out) + ')'
+
+
+def text_overlay(value, field, font_ref, urdu_font_path=None):
+    x, y, width, fs = field
+    y += LIFT
+    display, is_urdu = process_text(value, urdu_font_path)
+    if not is_urdu:
+        try:
+            s = pdf_string(display)
+        except UnicodeEncodeError:
+            s = None
+        if s is not None:
+            w = pdfmetrics.stringWidth(display, STAMP_FONT, fs)
+            size = min(fs, fs * width / w) if w else fs
+            return f"BT {font_ref} {size:.2f} Tf {x:.2f} {y:.2f} Td {s} Tj ET"
+    # Not WinAnsi: the glyph outlines of each script run, nothing to embed
+    size = fs + 1 if is_urdu else fs
+    runs, advance = [], 0
+    for seg, font in script_runs(value, urdu_font_path):
+        path = [" ".join(f"{v:.2f}" for v in args) + f" {op}" if args else op
+                for op, *args in formula(mpl_text(seg, font), font, size).ops]
+        runs.append(f"q 1 0 0 1 {advance:.2f} 0 cm " + " ".join(path) + " f Q")
+        advance += text_width(seg, font, size)
+    scale = min(1, width / advance) if advance > 0 else 1
+    return f"q {scale:.4f} 0 0 {scale:.4f} {x:.2f} {y:.2f} cm 0 g " + " ".join(runs) + " Q"
+
+
+def qr_overlay(value, corner):
+    """Dark modules as filled rectangles, one per horizontal run"""
+    qr = qrencoder.QRCode(None, qrencoder.QRErrorCorrectLevel.M)
+    qr.addData(value)
+    qr.version = qr.calculate_version()
+    qr.makeImpl(False, QR_MASK)
+    n = qr.getModuleCount()
+    m = QR_SIZE * PT / n
+    right, top = corner
+    x0 = right - QR_SIZE * PT
+    rects = []
+    for r in range(n):
+        c = 0
+        while c < n:
+            if not qr.isDark(r, c):
+                c += 1
+                continue
+            start = c
+            while c < n and qr.isDark(r, c): c += 1
+            rects.append(f"{x0 + start * m:.2f} {top - (r + 1) * m:.2f} {(c - start) * m:.2f} {m:.2f} re")
+    return "q 0 g " + " ".join(rects) + " f Q"
+
+
+def overlay(student, fields, font_ref, urdu_font_path=None):
+    """The operators stamped onto a student's first page (ASCII)"""
+    parts = [text_overlay(student[key], fields[key], font_ref, urdu_font_path)
+             for key in ("name", "roll") if student[key]]
+    if student["qr"]: parts.append(qr_overlay(student["qr"], fields["qr"]))
+    return "\n".join(parts) + "\n"
+
+
+# =============================================================================
+#    STAMPING
+# =============================================================================
+def paper_forms(c, pages, cache=None):
+    """Draws every page of the paper once, as a form XObject; returns their names"""
+    names, forms, typeset = [], {}, {}
+    for i, (ops, _) in enumerate(iter_page_ops(pages, cache, typeset=typeset)):
+        name = f"Paper{i}"
+        c.beginForm(name, 0, 0, PAGE_W * PT, PAGE_H * PT)
+        draw_ops(c, ops, forms)
+        c.endForm()
+        names.append(name)
+    define_forms(c, forms, typeset)
+    return names
+
+
+def share_page(c, index, shared):
+    """Points the page just finished at the content stream, resources and
+    media box of the same page in the first copy, so each further copy costs
+    one small page object (page 1 carries the overlay, so keeps its stream)"""
+    page = c._doc.Pages.pages[-1]
+    if "box" not in shared:
+        shared["box"] = c._doc.Reference(pdfdoc.PDFArray([0, 0, page.pagewidth, page.pageheight]))
+    if index == 0 or index not in shared: compress_last_page(c)
+    if index not in shared:
+        resources = pdfdoc.PDFResourceDictionary()
+        resources.basicFonts()
+        resources.XObject = page.XObjects
+        shared[index] = (page.Contents, c._doc.Reference(resources))
+    contents, page.Resources = shared[index]
+    if index: page.Contents, page.stream = contents, None
+    page.MediaBox = shared["box"]
+
+
+def stamp_merged(fn, pages, students, fields, urdu_font_path=None, progress=None, report=None, cache=None):
+    """One print file: the paper is drawn once, each student's copy is its
+    pages by reference plus the overlay on page 1"""
+    c = rl_canvas.Canvas(fn, pagesize=(PAGE_W * PT, PAGE_H * PT))
+    with span("paper forms", "render", pages=len(pages)):
+        names = paper_forms(c, pages, cache)
+    font_ref = c._doc.getInternalFontName(STAMP_FONT)
+    shared = {} # page index -> (contents, resources) of the first copy
+    for s_idx, student in enumerate(students):
+        for i, name in enumerate(names):
+            c.doForm(name)
+            if i == 0: c.addLiteral(overlay(student, fields, font_ref, urdu_font_path))
+            c.showPage()
+            share_page(c, i, shared)
+        if progress: progress(f"Stamping paper {s_idx + 1} of {len(students)}", s_idx + 1, len(students))
+    save(c, report)
+
+
+def draw_template(c, pages, slot_size, cache=None):
+    """Draws the paper with an empty, uncompressed `slot_size` byte content
+    stream (starting with SLOT_MARKER) added to page 1 for the overlay"""
+    forms, typeset = {}, {}
+    for i, (ops, _) in enumerate(iter_page_ops(pages, cache, typeset=typeset)):
+        draw_ops(c, ops, forms)
+        c.showPage()
+        compress_last_page(c)
+        if i == 0:
+            page = c._doc.Pages.pages[-1]
+            slot = pdfdoc.PDFStream(content=SLOT_MARKER + " " * (slot_size - len(SLOT_MARKER)))
+            page.Contents = pdfdoc.PDFArray([page.Contents, slot])
+    define_forms(c, forms, typeset)
+
+
+def student_path(fn, student, index, taken):
+    base, ext = os.path.splitext(fn)
+    tag = SAFE_NAME_RE.sub("_", student["roll"] or student["name"]).strip("_") or str(index + 1)
+    path = f"{base}_{tag}{ext or '.pdf'}"
+    n = 2
+    while path in taken:
+        path = f"{base}_{tag}_{n}{ext or '.pdf'}"
+        n += 1
+    taken.add(path)
+    return path
+
+
+def stamp_files(fn, pages, students, fields, urdu_font_path=None, progress=None, report=None, cache=None):
+    """One file per student: the paper is rendered once and each copy only
+    has the overlay written into page 1's slot (same length, so every offset
+    in the file stays valid). Returns the files written."""
+    out = io.BytesIO()
+    c = rl_canvas.Canvas(out, pagesize=(PAGE_W * PT, PAGE_H * PT))
+    font_ref = c._doc.getInternalFontName(STAMP_FONT)
+    overlays = [overlay(s, fields, font_ref, urdu_font_path).encode('ascii') for s in students]
+    slot_size = len(SLOT_MARKER) + max(map(len, overlays))
+    with span("template", "render", pages=len(pages)):
+        draw_template(c, pages, slot_size, cache)
+        save(c, report)
+    template = out.getvalue()
+    start = template.index(SLOT_MARKER.encode('ascii'))
+    head, tail = template[:start], template[start + slot_size:]
+
+    files, taken = [], set()
+    try:
+        for s_idx, (student, stamp) in enumerate(zip(students, overlays)):
+            out = student_path(fn, student, s_idx, taken)
+            with open(out + ".part", 'wb') as f:
+                f.write(head + stamp.ljust(slot_size) + tail)
+            os.replace(out + ".part", out)
+            files.append(out)
+            if progress: progress(f"Stamping paper {s_idx + 1} of {len(students)}", s_idx + 1, len(students))
+    except BaseException:
+        # Cancelled or failed: no partial class set left behind
+        for out in files + [p + ".part" for p in taken]:
+            if os.path.exists(out): os.remove(out)
+        raise
+    return files
+
+
+def export_student_papers(fn, metadata, sections, students, urdu_font_path=None, per_student=False,
+                          progress=None, answer_key=False, report=None):
+    """Lays the paper out once and stamps it for every student in `students`
+    (see read_students): into `fn` as one print file, or with `per_student`
+    into fn_<roll number>.pdf files. With `answer_key` the plain key goes to
+    fn_Key.pdf. `report` (an ExportReport) collects what was written.
+    reportlab only. Returns the files written."""
+    from exporter import key_path, page_cache, peak_rss, render_pages
+    from layout import layout_exam, layout_exam_and_key
+    if not students: raise ValueError("The student list is empty")
+    if answer_key: pages, key_pages = layout_exam_and_key(metadata, sections, urdu_font_path, progress, report)
+    else: pages = layout_exam(metadata, sections, urdu_font_path, progress, report)
+    fields = student_fields(pages[0])
+
+    if per_student:
+        files = stamp_files(fn, pages, students, fields, urdu_font_path, progress, report, page_cache())
+    else:
+        tmp_fn = fn + ".part"
+        try:
+            stamp_merged(tmp_fn, pages, students, fields, urdu_font_path, progress, report, page_cache())
+            os.replace(tmp_fn, fn)
+        finally:
+            if os.path.exists(tmp_fn): os.remove(tmp_fn)
+        files = [fn]
+    if report is not None:
+        report.files += files
+        report.pages += len(pages) * len(students)
+        report.peak_rss = peak_rss()
+    if answer_key:
+        render_pages(key_path(fn), key_pages, progress=progress, report=report)
+        files.append(key_path(fn))
+    return files
+
+
+if __name__ == "__main__":
+    # python stamping.py exam.csv students.csv [-o Exam.pdf] [--per-student] [--key]
+    from examfile import read_exam_csv
+    from exporter import ExportReport
+    from projectfile import read_project, is_project
+    import fonts
+    fonts.install_font_cache()
+
+    parser = argparse.ArgumentParser(description="Export the paper pre-printed with each student's name, "
+                                                 "roll number and QR code.")
+    parser.add_argument("input", help="progress CSV or .paperify project")
+    parser.add_argument("students", help="CSV with a header row: Name, Roll No and optionally QR")
+    parser.add_argument("-o", "--out", help="PDF name (default: next to the input)")
+    parser.add_argument("--per-student", action="store_true", help="one PDF per student instead of one print file")
+    parser.add_argument("--key", action="store_true", help="also write the answer key")
+    args = parser.parse_args()
+
+    metadata, sections = read_project(args.input) if is_project(args.input) else read_exam_csv(args.input)
+    students = read_students(args.students)
+    out = args.out or os.path.splitext(args.input)[0] + ".pdf"
+    report = ExportReport()
+    t0 = time.perf_counter()
+    files = export_student_papers(out, metadata, sections, students, fonts.urdu_font(), args.per_student,
+                                  answer_key=args.key, report=report)
+    elapsed = time.perf_counter() - t0
+    print(f"{len(students)} papers, {len(files)} files in {elapsed:.2f} s ({len(students) / elapsed:.0f} papers/s)")
+    print(report.summary())
@@ -0,0 +1,62 @@
+import builtins
+import os
+import sys
+import threading
+import time
+
+# =============================================================================
+#    STARTUP PROFILE (python main.py --startup-profile, or the frozen exe)
+# =============================================================================
+# Times every module imported after install() (cumulative, like -X importtime,
+# which is not available in the PyInstaller build) plus named milestones.
+ENABLED = "--startup-profile" in sys.argv or bool(os.environ.get("PAPERIFY_STARTUP_PROFILE"))
+
+T0 = time.perf_counter()
+_imports = [] # (depth, name, thread, seconds) in the order imports started
+_marks = [] # (label, seconds since T0)
+_local = threading.local() # nesting depth, per thread (the warm-up imports too)
+_orig_import = builtins.__import__
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules:
+        return _orig_import(name, globals, locals, fromlist, level)
+    depth = getattr(_local, "depth", 0)
+    thread = threading.current_thread().name
+    slot = len(_imports)
+    _imports.append((depth, name, thread, 0.0))
+    _local.depth = depth + 1
+    t = time.perf_counter()
+    try:
+        return _orig_import(name, globals, locals, fromlist, level)
+    finally:
+        _local.depth = depth
+        _imports[slot] = (depth, name, thread, time.perf_counter() - t)
+
+
+def install():
+    if ENABLED: builtins.__import__ = _timed_import
+
+
+def mark(label):
+    if ENABLED: _marks.append((label, time.perf_counter() - T0))
+
+
+def report(min_ms=1.0):
+    lines = ["Startup profile", "---------------"]
+    for label, t in _marks:
+        lines.append(f"{t * 1000:9.1f} ms  {label}")
+    lines += ["", "Imports (cumulative ms, nested by depth)"]
+    for depth, name, thread, t in _imports:
+        if t * 1000 >= min_ms:
+            where = "" if thread == "MainThread" else f"  [{thread}]"
+            lines.append(f"{t * 1000:9.1f} ms  {'  ' * depth}{name}{where}")
+    text = "\n".join(lines)
+
+    if sys.stderr:
+        print(text, file=sys.stderr)
+    else:
+        # Windowed frozen build has no console, drop the report next to the exe
+        path = os.path.join(os.path.dirname(sys.executable), "startup_profile.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
@@ -0,0 +1,44 @@
+from reportlab import rl_config
+
+import exporter
+from examfile import DEFAULT_METADATA
+from exporter import POOL_MIN_PAGES, export_exam_pdf, page_pool
+
+
+def sample_paper(n):
+    steps = "and explain each step of the working " * 6
+    questions = [{"type": "Short/Long Question", "text": f"Show that $x^{i} + {i}$ is positive {steps}"}
+                 for i in range(n)]
+    sec = {"name": "Section A", "desc": "Answer all", "marks_per_q": 5, "attempt_count": n,
+           "total_marks": 5 * n, "questions": questions}
+    return dict(DEFAULT_METADATA, **{"class": "9", "subject": "Math"}), [sec]
+
+
+def test_page_pool_only_for_long_reportlab_papers():
+    assert page_pool(1) is None
+    assert page_pool(2, "matplotlib") is None
+    assert page_pool(2, pages=[()] * (POOL_MIN_PAGES - 1)) is None
+    pool = page_pool(2, pages=[()] * POOL_MIN_PAGES)
+    assert pool is not None
+    pool.shutdown()
+
+
+def test_pooled_export_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(rl_config, "invariant", 1) # fixed dates and document ID
+    monkeypatch.setattr(exporter, "page_cache", lambda: None)
+    pools = []
+
+    def counting_pool(*args):
+        pool = page_pool(*args)
+        pools.append(pool)
+        return pool
+
+    monkeypatch.setattr(exporter, "page_pool", counting_pool)
+    metadata, sections = sample_paper(80)
+    for stream in (False, True):
+        serial, pooled = tmp_path / f"serial{stream}.pdf", tmp_path / f"pooled{stream}.pdf"
+        count = export_exam_pdf(str(serial), metadata, sections, stream=stream, jobs=1)
+        assert count >= POOL_MIN_PAGES
+        export_exam_pdf(str(pooled), metadata, sections, stream=stream, jobs=2)
+        assert pooled.read_bytes() == serial.read_bytes()
+    assert [pool is not None for pool in pools] == [False, True, False, True]
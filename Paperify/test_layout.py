@@ -0,0 +1,146 @@
+import itertools
+import random
+import subprocess
+import sys
+from collections import Counter
+
+import pytest
+
+import layout
+from examfile import DEFAULT_METADATA
+from exporter import ExportReport
+from layout import (
+    BODY_H, PAGE_H, PAGE_W, SPLIT_PENALTY, Box, Rule, Text, build_blocks, greedy_page_count, key_block,
+    layout_exam, optimal_breaks, paginate, split_block
+)
+
+WORDS = "the quick brown fox jumps over the lazy dog while the exam runs long".split()
+
+
+def sentence(n):
+    return " ".join(WORDS[i % len(WORDS)] for i in range(n))
+
+
+def section(name, questions):
+    return {"name": name, "desc": "Answer all", "marks_per_q": 1, "attempt_count": len(questions),
+            "total_marks": len(questions), "questions": questions}
+
+
+def sample_paper():
+    mcqs = [{"type": "MCQ", "text": f"Question {i} {sentence(12)}", "options": ["one", "two", "three", "four"]}
+            for i in range(15)]
+    shorts = [{"type": "Short/Long Question", "text": f"Question {i} {sentence(20 + 7 * i)}"} for i in range(10)]
+    match = [{"type": "Match Columns", "text": "Match the columns",
+              "col_a": [f"left {i}" for i in range(6)], "col_b": [f"right {i}" for i in range(6)]}]
+    return dict(DEFAULT_METADATA, **{"class": "9", "subject": "Science"}), \
+        [section("Section A", mcqs), section("Section B", shorts), section("Section C", match)]
+
+
+def test_layout_is_qt_free():
+    code = "import sys, layout; print(any(m.startswith('PySide6') for m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_block_items_hang_below_the_block_top():
+    for blk in build_blocks(*sample_paper()):
+        assert blk.height > 0
+        for item in blk.items:
+            assert (item.y0 if isinstance(item, Rule) else item.y) <= 0
+
+
+def test_pages_keep_every_item_on_the_page():
+    pages = layout_exam(*sample_paper())
+    assert len(pages) > 1
+    for page in pages:
+        for item in page:
+            if isinstance(item, Rule):
+                assert 0 <= item.x0 <= item.x1 <= PAGE_W and 0 <= item.y0 <= PAGE_H
+            elif isinstance(item, Box):
+                assert 0 <= item.x and item.x + item.w <= PAGE_W and 0 <= item.y and item.y + item.h <= PAGE_H
+            else:
+                assert 0 <= item.x <= PAGE_W and 0 <= item.y <= PAGE_H
+
+
+def test_questions_come_out_in_order():
+    metadata, sections = sample_paper()
+    numbers = [item.text for page in layout_exam(metadata, sections) for item in page
+               if isinstance(item, Text) and item.weight == 'bold' and item.text.endswith(".")]
+    assert numbers == [f"{i + 1}." for sec in sections for i in range(len(sec['questions']))]
+
+
+# --- page breaking ---
+def cost(sizes, starts):
+    """(pages, badness) of breaking before `starts` as optimal_breaks scores
+    it, None if a page overflows"""
+    bounds = list(zip(starts, starts[1:] + [len(sizes)]))
+    badness = 0.0
+    for a, b in bounds:
+        fill = sum(h for h, _, _ in sizes[a:b - 1]) + sizes[b - 1][1]
+        if fill > BODY_H and b - a > 1: return None
+        if b < len(sizes): badness += max(0.0, BODY_H - sum(h for h, _, _ in sizes[a:b])) ** 2 + sizes[b - 1][2]
+    return len(bounds), badness
+
+
+def test_optimal_breaks_matches_brute_force():
+    rng = random.Random(24)
+    for _ in range(300):
+        n = rng.randint(1, 9)
+        sizes = []
+        for _ in range(n):
+            h = rng.uniform(0.3, BODY_H * 0.7)
+            sizes.append((h, h * rng.uniform(0.5, 1), rng.choice((0.0, 0.0, SPLIT_PENALTY))))
+        best = min(c for k in range(n) for rest in itertools.combinations(range(1, n), k)
+                   if (c := cost(sizes, [0, *rest])) is not None)
+        got = cost(sizes, optimal_breaks(sizes))
+        assert got[0] == best[0] and abs(got[1] - best[1]) < 1e-6
+
+
+def texts(items):
+    return Counter(item.text for item in items if isinstance(item, Text))
+
+
+def test_split_block_keeps_every_item():
+    cut = 0
+    for blk in build_blocks(*sample_paper()):
+        pieces = split_block(blk)
+        cut += len(pieces) > 1
+        assert sum(len(p.items) for p in pieces) == len(blk.items)
+        assert texts(it for p in pieces for it in p.items) == texts(blk.items)
+        assert abs(sum(p.height for p in pieces) - blk.height) < 1e-9
+    assert cut
+
+
+def test_paginate_keeps_every_item_and_beats_greedy():
+    blocks = build_blocks(*sample_paper())
+    pages = paginate(blocks)
+    assert texts(it for page in pages for it in page) == texts(it for blk in blocks for it in blk.items)
+    assert len(pages) <= greedy_page_count(blocks)
+
+
+# --- answer key ---
+@pytest.mark.parametrize("q", [
+    {"type": "MCQ", "text": "Pick one", "options": ["one", "two", "", ""], "answer": 2},
+    {"type": "MCQ", "text": "Pick one", "options": ["one", "two"], "answer": 5},
+    {"type": "Match Columns", "text": "Match", "col_a": ["a", "b"], "col_b": ["x"], "answer": [0, 1]},
+])
+def test_key_skips_answers_that_dont_fit(q):
+    with pytest.warns(UserWarning, match="left out of the key"):
+        assert key_block(q, 1) is None
+    with pytest.warns(UserWarning):
+        blk = key_block(dict(q, notes="Marking notes"), 1)
+    assert "Marking notes" in texts(blk.items)
+
+
+def test_key_pages_dont_count_as_saved(monkeypatch):
+    reports = []
+
+    def recording_paginate(blocks, report=None):
+        reports.append(report)
+        return paginate(blocks, report)
+
+    monkeypatch.setattr(layout, "paginate", recording_paginate)
+    metadata, sections = sample_paper()
+    report = ExportReport()
+    layout.layout_exam_and_key(metadata, sections, report=report)
+    assert reports == [report, None]
@@ -0,0 +1,37 @@
+import io
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from reportlab import rl_config
+
+from examfile import DEFAULT_METADATA
+from layout import layout_exam
+from render_reportlab import PAGES_PER_TASK, render_pdf
+
+
+def sample_pages():
+    questions = [{"type": "Short/Long Question",
+                  "text": f"Find $x^{i}$ when $\\frac{{{i}}}{{x}} = {i + 1}$ and explain each step"} for i in range(60)]
+    questions += [{"type": "MCQ", "text": f"Which is $\\sqrt{{{i}}}$?", "options": ["a", "b", "$\\pi$", "none"]}
+                  for i in range(40)]
+    sec = {"name": "Section A", "desc": "Answer all", "marks_per_q": 1, "attempt_count": len(questions),
+           "total_marks": len(questions), "questions": questions}
+    return layout_exam(dict(DEFAULT_METADATA, **{"class": "9", "subject": "Math"}), [sec])
+
+
+def render(pages, pool=None):
+    out = io.BytesIO()
+    count = render_pdf(out, pages, pool=pool)
+    assert count == len(pages)
+    return out.getvalue()
+
+
+def test_pool_output_matches_serial(monkeypatch):
+    monkeypatch.setattr(rl_config, "invariant", 1) # fixed dates and document ID
+    pages = sample_pages()
+    assert len(pages) > PAGES_PER_TASK
+    serial = render(pages)
+    # spawned, so the workers start with none of this process's caches
+    with ProcessPoolExecutor(max_workers=2, mp_context=get_context("spawn")) as pool:
+        pooled = render(pages, pool)
+    assert pooled == serial
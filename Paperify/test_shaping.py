@@ -0,0 +1,54 @@
+import pytest
+
+from shaping import HAS_URDU_LIB, URDU_GLYPH_RE, script_runs
+
+pytestmark = pytest.mark.skipif(not HAS_URDU_LIB, reason="arabic-reshaper / python-bidi not installed")
+
+FONT = "urdu.ttf" # only passed through, the default reshaper is used when it can't be read
+YEH_HEH = "\u06cc\u06c1" # "this"
+HAI = "\u06c1\u06d2" # "is"
+QEEMAT = "\u0642\u06cc\u0645\u062a" # "value"
+ALIF, BEH = "\u0627\u0644\u0641", "\u0628"
+
+
+def shape(runs):
+    """(font, segment) for the English/math runs, (font, "urdu") for the rest"""
+    out = []
+    for seg, font in runs:
+        if font is None: out.append((None, seg.strip()))
+        else:
+            assert all(URDU_GLYPH_RE.match(ch) or not ch.isalnum() for ch in seg)
+            out.append((font, "urdu"))
+    return out
+
+
+def test_plain_english_is_one_run():
+    assert script_runs("Solve $x^2 = 4$ for x", FONT) == (("Solve $x^2 = 4$ for x", None),)
+
+
+def test_english_word_inside_urdu():
+    # Right to left: the last Urdu word is drawn first
+    runs = script_runs(f"{YEH_HEH} test {HAI}", FONT)
+    assert shape(runs) == [(FONT, "urdu"), (None, "test"), (FONT, "urdu")]
+
+
+def test_math_span_stays_whole():
+    runs = script_runs(f"{QEEMAT} $x^2+1$ {HAI}", FONT)
+    assert shape(runs) == [(FONT, "urdu"), (None, "$x^2+1$"), (FONT, "urdu")]
+
+
+def test_math_spans_follow_the_urdu_order():
+    runs = script_runs(f"{ALIF} $a$ {BEH} $b$ {HAI}", FONT)
+    assert shape(runs) == [(FONT, "urdu"), (None, "$b$"), (FONT, "urdu"), (None, "$a$"), (FONT, "urdu")]
+
+
+def test_english_first_line_reads_left_to_right():
+    runs = script_runs(f"Find {QEEMAT} of $x$", FONT)
+    assert shape(runs) == [(None, "Find"), (FONT, "urdu"), (None, "of $x$")]
+
+
+def test_runs_keep_the_english_and_math():
+    text = f"{ALIF} $a+b$ {BEH} 12 test {HAI}"
+    drawn = "".join(seg for seg, _ in script_runs(text, FONT))
+    assert drawn.count(" ") == text.count(" ")
+    for part in ("$a+b$", "12", "test"): assert part in drawn
@@ -0,0 +1,178 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# =============================================================================
+#    EXPORT TRACING (opt in: PAPERIFY_TRACE=trace.json or --trace trace.json)
+# =============================================================================
+# Two kinds of records, both off by default and close to free while off:
+#   span("page", number=3)  timed block, becomes one Chrome trace event
+#   @traced("text_extent")  call count plus total and self time of a hot
+#                           function; put it *under* an lru_cache so only
+#                           real work is counted (hits are in cache_stats)
+# save() writes a Chrome trace (chrome://tracing, ui.perfetto.dev) with the
+# function table and per-span totals added under "paperifySummary".
+ENV = "PAPERIFY_TRACE"
+
+_on = bool(os.environ.get(ENV))
+_lock = threading.Lock()
+_events = [] # Chrome "X" (complete) events
+_calls = {} # name -> [calls, total s, self s]
+_local = threading.local() # .child: time spent in traced callees of the current call
+
+
+def enabled():
+    return _on
+
+
+def enable(path=None):
+    """Turns tracing on here and, through the environment, in worker processes
+    started from now on"""
+    global _on
+    _on = True
+    os.environ[ENV] = path or os.environ.get(ENV) or "paperify-trace.json"
+
+
+def trace_path():
+    return os.environ.get(ENV) or None
+
+
+def _us(t):
+    # perf_counter is system wide, so worker processes line up on one timeline
+    return round(t * 1e6, 1)
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "t")
+
+    def __init__(self, name, cat, args):
+        self.name, self.cat, self.args = name, cat, args
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+        return self
+
+    def set(self, **args):
+        """Adds args known only once the span has started"""
+        self.args.update(args)
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        event = {"name": self.name, "cat": self.cat, "ph": "X", "ts": _us(self.t), "dur": round((end - self.t) * 1e6, 1),
+                 "pid": os.getpid(), "tid": threading.get_native_id()}
+        if self.args: event["args"] = self.args
+        _events.append(event)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self): return self
+
+    def set(self, **args): pass
+
+    def __exit__(self, *exc): return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, cat="export", **args):
+    return _Span(name, cat, args) if _on else _NO_SPAN
+
+
+def traced(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _on: return fn(*args, **kwargs)
+            outer = getattr(_local, "child", 0.0)
+            _local.child = 0.0
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - t
+                own = elapsed - _local.child
+                _local.child = outer + elapsed
+                with _lock:
+                    stat = _calls.setdefault(name, [0, 0.0, 0.0])
+                    stat[0] += 1
+                    stat[1] += elapsed
+                    stat[2] += own
+        return wrapper
+    return decorate
+
+
+# =============================================================================
+#    COLLECTING AND SAVING
+# =============================================================================
+def take():
+    """Returns and clears what this process recorded: (events, calls). Worker
+    processes hand this back so the parent can merge() it into one trace."""
+    with _lock:
+        events, calls = _events[:], {k: list(v) for k, v in _calls.items()}
+        _events.clear()
+        _calls.clear()
+    return events, calls
+
+
+def merge(recorded):
+    events, calls = recorded
+    with _lock:
+        _events.extend(events)
+        for name, (n, total, own) in calls.items():
+            stat = _calls.setdefault(name, [0, 0.0, 0.0])
+            stat[0] += n
+            stat[1] += total
+            stat[2] += own
+
+
+def summary():
+    with _lock:
+        events = _events[:]
+        calls = {k: list(v) for k, v in _calls.items()}
+    spans = {}
+    for e in events:
+        s = spans.setdefault(e["name"], {"count": 0, "total_ms": 0.0})
+        s["count"] += 1
+        s["total_ms"] += e["dur"] / 1000
+    functions = {name: {"calls": n, "total_ms": total * 1000, "self_ms": own * 1000}
+                 for name, (n, total, own) in calls.items()}
+    return {"spans": spans, "functions": functions}
+
+
+def format_summary(data):
+    lines = [f"{'function':<28} {'calls':>8} {'total ms':>10} {'self ms':>10}"]
+    for name, f in sorted(data["functions"].items(), key=lambda kv: -kv[1]["self_ms"]):
+        lines.append(f"{name:<28} {f['calls']:>8} {f['total_ms']:>10.1f} {f['self_ms']:>10.1f}")
+    lines.append(f"{'span':<28} {'count':>8} {'total ms':>10}")
+    for name, s in sorted(data["spans"].items(), key=lambda kv: -kv[1]["total_ms"]):
+        lines.append(f"{name:<28} {s['count']:>8} {s['total_ms']:>10.1f}")
+    return "\n".join(lines)
+
+
+def save(path=None):
+    """Writes everything recorded so far; returns the path, or None when off"""
+    if not _on: return None
+    path = path or trace_path()
+    with _lock:
+        events = _events[:]
+    data = {"traceEvents": events, "displayTimeUnit": "ms", "paperifySummary": summary()}
+    part = path + ".part"
+    with open(part, "w") as f:
+        json.dump(data, f)
+    os.replace(part, path)
+    return path
+
+
+if __name__ == "__main__":
+    # python tracing.py trace.json: prints the summary table of a saved trace
+    if len(sys.argv) != 2:
+        sys.exit("usage: python tracing.py <trace.json>")
+    with open(sys.argv[1]) as f:
+        print(format_summary(json.load(f)["paperifySummary"]))
@@ -0,0 +1,167 @@
+import argparse
+import os
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import tracing
+from exporter import DEFAULT_BACKEND, ExportReport, key_path, render_pages
+
+# "All/None/Both of the above" only makes sense in its original slot
+PINNED_OPTION_RE = re.compile(r'\bof the above\b', re.IGNORECASE)
+
+# =============================================================================
+#    VARIANTS (shuffled sets A/B/C/D of the same paper, reproducible by seed)
+# =============================================================================
+def variant_label(index):
+    return chr(ord('A') + index) if index < 26 else str(index + 1)
+
+
+def variant_rng(seed, index):
+    # String seeds hash the same on every run and platform
+    return random.Random(f"{seed}:{index}")
+
+
+def shuffle_options(options, rng):
+    """Shuffles the filled-in options among their own slots; blank and
+    "... of the above" options stay where they are. Returns (options, moved)
+    where moved[old index] is the option's new index."""
+    movable = [i for i, o in enumerate(options) if o.strip() and not PINNED_OPTION_RE.search(o)]
+    order = movable[:]
+    rng.shuffle(order)
+    out = list(options)
+    moved = list(range(len(options)))
+    for slot, src in zip(movable, order):
+        out[slot] = options[src]
+        moved[src] = slot
+    return out, moved
+
+
+def make_variant(metadata, sections, seed, index):
+    """Returns (label, metadata, sections) for one set. The input is not
+    modified; questions are shallow-copied only where they change."""
+    rng = variant_rng(seed, index)
+    label = variant_label(index)
+    md = dict(metadata, test=f"{metadata['test']} - Set {label}")
+    out = []
+    for sec in sections:
+        questions = []
+        for q in sec['questions']:
+            if q['type'] == "MCQ":
+                options, moved = shuffle_options(q.get('options', []), rng)
+                q = dict(q, options=options)
+                if q.get('answer') is not None: q['answer'] = moved[q['answer']] # the key follows the shuffle
+            questions.append(q)
+        rng.shuffle(questions)
+        out.append(dict(sec, questions=questions))
+    return label, md, out
+
+
+def variant_path(fn, label):
+    base, ext = os.path.splitext(fn)
+    return f"{base}_Set{label}{ext or '.pdf'}"
+
+
+def _layout_variant(metadata, sections, urdu_font_path, answer_key=False):
+    # Runs in a worker process; pages are plain namedtuples and pickle back,
+    # along with the pages saved by breaking and whatever tracing recorded there
+    from layout import layout_exam, layout_exam_and_key
+    counts = ExportReport()
+    if answer_key: paper, key = layout_exam_and_key(metadata, sections, urdu_font_path, report=counts)
+    else: paper, key = layout_exam(metadata, sections, urdu_font_path, report=counts), None
+    return paper, key, counts.pages_saved, tracing.take()
+
+
+def export_variants(fn, metadata, sections, count, seed, urdu_font_path=None, backend=DEFAULT_BACKEND,
+                    combined=False, jobs=None, progress=None, answer_key=False, report=None):
+    """Lays out `count` shuffled sets on worker processes, then renders them
+    here: one PDF per set (fn_SetA.pdf, ...) or all sets in `fn`. With
+    `answer_key` each set's key (answers follow its shuffle) goes to *_Key.pdf.
+    `report` (an ExportReport) collects what was written, over all sets.
+
+    Returns (files written, total pages). Layout is the expensive part and
+    runs concurrently. The same workers, their text caches warm from laying
+    out the sets, then measure the pages while this process draws them in
+    order. Files are only written here, and a cancel from `progress` (or an
+    error) removes the ones already written, so no half class set is left
+    on disk."""
+    variants = [make_variant(metadata, sections, seed, i) for i in range(count)]
+    jobs = max(1, min(jobs or os.cpu_count() or 1, count))
+
+    layouts, written = [], []
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    finished = False
+
+    def render(out, pages):
+        render_pages(out, pages, backend, progress, report, pool)
+        written.append(out)
+
+    try:
+        if pool is None:
+            for i, (label, md, secs) in enumerate(variants):
+                if progress: progress(f"Laying out Set {label}", i, count)
+                paper, key, saved, recorded = _layout_variant(md, secs, urdu_font_path, answer_key)
+                tracing.merge(recorded)
+                if report is not None: report.pages_saved += saved
+                layouts.append((paper, key))
+        else:
+            futures = [pool.submit(_layout_variant, md, secs, urdu_font_path, answer_key) for _, md, secs in variants]
+            for i, (fut, (label, _, _)) in enumerate(zip(futures, variants)):
+                if progress: progress(f"Laying out Set {label}", i, count)
+                paper, key, saved, recorded = fut.result()
+                tracing.merge(recorded)
+                if report is not None: report.pages_saved += saved
+                layouts.append((paper, key))
+
+        if combined:
+            render(fn, [page for paper, _ in layouts for page in paper])
+            if answer_key: render(key_path(fn), [page for _, key in layouts for page in key])
+            files = [fn]
+        else:
+            files = []
+            for (label, _, _), (paper, key) in zip(variants, layouts):
+                out = variant_path(fn, label)
+                render(out, paper)
+                if answer_key: render(key_path(out), key)
+                files.append(out)
+        finished = True
+    except BaseException:
+        # Cancelled or failed: no partial set of papers left behind
+        for out in written:
+            if os.path.exists(out): os.remove(out)
+        raise
+    finally:
+        # On cancel/error don't wait for the work still queued
+        if pool is not None: pool.shutdown(wait=finished, cancel_futures=True)
+    return files, sum(len(paper) for paper, _ in layouts)
+
+
+if __name__ == "__main__":
+    # python variants.py exam.csv -n 4 --seed 2024 [--combined] [-o Exam.pdf]
+    from examfile import read_exam_csv
+    from projectfile import read_project, is_project
+    import fonts
+    fonts.install_font_cache()
+
+    parser = argparse.ArgumentParser(description="Export shuffled sets (A, B, C, ...) of a paper.")
+    parser.add_argument("input", help="progress CSV or .paperify project")
+    parser.add_argument("-n", "--count", type=int, default=4, help="number of sets (default: 4)")
+    parser.add_argument("--seed", default="0", help="same seed, same sets (default: 0)")
+    parser.add_argument("--combined", action="store_true", help="write all sets into one PDF")
+    parser.add_argument("--key", action="store_true", help="also write the answer key(s)")
+    parser.add_argument("-o", "--out", help="PDF name (default: next to the input)")
+    parser.add_argument("-j", "--jobs", type=int, help="layout worker processes (default: number of cores)")
+    parser.add_argument("--trace", metavar="JSON", help="write a Chrome trace of the export (or set PAPERIFY_TRACE)")
+    args = parser.parse_args()
+    if args.trace: tracing.enable(args.trace)
+
+    metadata, sections = read_project(args.input) if is_project(args.input) else read_exam_csv(args.input)
+    out = args.out or os.path.splitext(args.input)[0] + ".pdf"
+    report = ExportReport()
+    files, pages = export_variants(out, metadata, sections, args.count, args.seed, fonts.urdu_font(),
+                                   combined=args.combined, jobs=args.jobs, answer_key=args.key, report=report)
+    for f in report.files: print("wrote", f)
+    print(report.summary())
+    if tracing.enabled():
+        print(tracing.format_summary(tracing.summary()))
+        print("trace written to", tracing.save())